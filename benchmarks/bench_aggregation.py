@@ -0,0 +1,46 @@
+"""
+Aggregation of scaled up crimes, see generators.crimes()
+"""
+import shutil
+import tempfile
+
+import drain
+from drain.aggregate import Aggregator
+
+from .generators import crimes, crime_aggregates, crime_aggregation, crime_left, Crimes
+
+
+class Aggregate(object):
+    params = [10, 100]
+    param_names = ['scale']
+
+    def setup(self, scale):
+        self.df = crimes(scale)
+
+    def time_aggregate(self, scale):
+        Aggregator(self.df, crime_aggregates()).aggregate(['District', 'Community Area'])
+
+
+class Spacetime(object):
+    params = [10, 100]
+    param_names = ['scale']
+    timeout = 300
+
+    def setup(self, scale):
+        self.path = drain.PATH
+        drain.PATH = tempfile.mkdtemp()
+        self.crimes = Crimes(scale=scale)
+        self.crimes.execute()
+        self.aggregation = crime_aggregation(self.crimes)
+        self.aggregation.execute()
+        self.left = crime_left(self.aggregation)
+
+    def teardown(self, scale):
+        shutil.rmtree(drain.PATH)
+        drain.PATH = self.path
+
+    def time_run(self, scale):
+        crime_aggregation(self.crimes).execute()
+
+    def time_join(self, scale):
+        self.aggregation.join(self.left)
@@ -0,0 +1,12 @@
+"""
+Startup time of the drain command and run_step.py, which import drain in
+a new process for every step
+"""
+
+
+def timeraw_import_drain():
+    return 'import drain'
+
+
+def timeraw_import_run_step():
+    return 'from drain import drake, serialize'
@@ -0,0 +1,33 @@
+"""
+Metrics of scores with 10% positive and 20% missing labels, see drain.metrics
+"""
+import numpy as np
+
+from drain import metrics
+
+
+class Metrics(object):
+    params = [10**5, 10**6]
+    param_names = ['n']
+
+    def setup(self, n):
+        random = np.random.RandomState(0)
+        self.y_true = (random.rand(n) < 0.1).astype(float)
+        self.y_true[random.rand(n) < 0.2] = np.nan
+        self.y_score = random.rand(n)
+        self.k = n // 100
+
+    def time_baseline(self, n):
+        metrics.baseline(self.y_true, self.y_score)
+
+    def time_precision(self, n):
+        metrics.precision(self.y_true, self.y_score, k=self.k, return_bounds=True)
+
+    def time_recall(self, n):
+        metrics.recall(self.y_true, self.y_score, k=self.k)
+
+    def time_precision_series(self, n):
+        metrics.precision_series(self.y_true, self.y_score)
+
+    def time_roc_auc(self, n):
+        metrics.roc_auc(self.y_true, self.y_score)
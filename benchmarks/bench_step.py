@@ -0,0 +1,89 @@
+"""
+Workflow construction, hashing, Drakefile generation and dumping of steps
+"""
+import shutil
+import tempfile
+
+import drain
+from drain import drake
+
+from .generators import step_graph, Crimes
+
+
+class Graph(object):
+    params = [100, 1000, 5000]
+    param_names = ['steps']
+
+    def setup(self, steps):
+        self.path = drain.PATH
+        drain.PATH = tempfile.mkdtemp()
+        self.workflow = step_graph(width=steps // 10)
+        self.steps = set().union(*(s.get_inputs() for s in self.workflow))
+
+    def teardown(self, steps):
+        shutil.rmtree(drain.PATH)
+        drain.PATH = self.path
+
+    def time_construct(self, steps):
+        step_graph(width=steps // 10)
+
+    def time_digest(self, steps):
+        for s in self.steps:
+            s.__dict__.pop('_digest', None)
+            s._digest
+
+    def peakmem_construct_hashed(self, steps):
+        # including the digest and paths of every step, as to_drakefile() uses them
+        for s in step_graph(width=steps // 10):
+            for i in s.get_inputs():
+                i._target_filename
+
+    def time_get_drake_data(self, steps):
+        drake.get_drake_data(self.workflow)
+
+    def time_to_drakefile(self, steps):
+        drake.to_drakefile(self.workflow, preview=True)
+
+    def time_status(self, steps):
+        drake.status(drake.get_drake_data(self.workflow))
+
+
+class Depth(object):
+    """
+    Hashing serializes a step with all of its inputs, so shared inputs are
+    serialized once per path to them
+    """
+    params = [2, 4, 8]
+    param_names = ['depth']
+
+    def setup(self, depth):
+        self.workflow = step_graph(width=10, depth=depth)
+
+    def time_digest(self, depth):
+        for s in self.workflow:
+            s.__dict__.pop('_digest', None)
+            s._digest
+
+
+class DumpLoad(object):
+    params = [10, 100]
+    param_names = ['scale']
+    timeout = 120
+
+    def setup(self, scale):
+        self.path = drain.PATH
+        drain.PATH = tempfile.mkdtemp()
+        self.step = Crimes(scale=scale)
+        self.step.result = self.step.run()
+        self.step.setup_dump()
+        self.step.dump()
+
+    def teardown(self, scale):
+        shutil.rmtree(drain.PATH)
+        drain.PATH = self.path
+
+    def time_dump(self, scale):
+        self.step.dump()
+
+    def time_load(self, scale):
+        self.step.load()
@@ -0,0 +1,48 @@
+"""
+Write and read throughput and file size of step dumps under different
+storage policies, see drain.step.hdf_args()
+"""
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+from drain import step
+
+
+def sparse_frame(rows=100000, columns=100, density=0.05, seed=0):
+    """
+    Returns: a DataFrame of mostly zero features, like those dumped by aggregations
+    """
+    random = np.random.RandomState(seed)
+    X = random.rand(rows, columns)
+    X[X > density] = 0
+    return pd.DataFrame(X, columns=['feature_%s' % i for i in range(columns)])
+
+
+class Storage(object):
+    params = [[None, 'zlib', 'blosc', 'lz4', 'zstd'], ['fixed', 'table']]
+    param_names = ['codec', 'format']
+    timeout = 120
+
+    def setup(self, codec, format):
+        self.dirname = tempfile.mkdtemp()
+        self.filename = os.path.join(self.dirname, 'result.h5')
+        self.df = sparse_frame()
+        self.storage = {'codec': codec, 'format': format}
+        step.write_hdf(self.filename, [('df', self.df)], self.storage)
+
+    def teardown(self, codec, format):
+        shutil.rmtree(self.dirname)
+
+    def time_write(self, codec, format):
+        step.write_hdf(self.filename, [('df', self.df)], self.storage)
+
+    def time_read(self, codec, format):
+        pd.read_hdf(self.filename, 'df')
+
+    def track_size(self, codec, format):
+        return os.path.getsize(self.filename)
+    track_size.unit = 'bytes'
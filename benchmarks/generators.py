@@ -0,0 +1,109 @@
+"""
+Synthetic workloads for the benchmarks, scaled up from tests/crimes.csv
+"""
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from drain.aggregate import Count
+from drain.aggregation import SpacetimeAggregation
+from drain.step import Step
+
+CRIMES = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                      'tests', 'crimes.csv')
+
+# the last date in tests/crimes.csv
+END = date(2015, 12, 31)
+
+
+def crimes(scale=10, seed=0):
+    """
+    Returns: the crimes in tests/crimes.csv repeated scale times, with unique
+        IDs and dates spread uniformly over the two years before END
+    """
+    # dates are replaced
+    df = pd.read_csv(CRIMES)
+    df = pd.concat([df] * scale, ignore_index=True)
+
+    random = np.random.RandomState(seed)
+    df['ID'] = np.arange(len(df))
+    df['Date'] = pd.Timestamp(END) - pd.to_timedelta(random.randint(0, 730, len(df)), unit='D')
+    return df
+
+
+def crime_aggregates():
+    return [Count(),
+            Count('Arrest'),
+            Count(lambda c: c['Primary Type'] == 'THEFT', 'theft', prop=True)]
+
+
+class Crimes(Step):
+    def __init__(self, scale=10):
+        Step.__init__(self, scale=scale)
+
+    def run(self):
+        return crimes(self.scale)
+
+
+class CrimeAggregation(SpacetimeAggregation):
+    def __init__(self, inputs, spacedeltas, dates, parallel=False):
+        self.inputs = inputs
+        SpacetimeAggregation.__init__(self, spacedeltas=spacedeltas, dates=dates,
+                                      date_column='Date', prefix='crimes', parallel=parallel)
+
+    def get_aggregates(self, date, delta):
+        return crime_aggregates()
+
+
+def crime_aggregation(crimes_step, n_dates=4):
+    """
+    Returns: a CrimeAggregation by district and community area on the first
+        day of each of the last n_dates months of END's year
+    """
+    dates = [date(END.year, m, 1) for m in range(13 - n_dates, 13)]
+    return CrimeAggregation(inputs=[crimes_step], dates=dates,
+                            spacedeltas={'district': ('District', ['1m', '6m', '1y']),
+                                         'community': ('Community Area', ['1m', '6m', '1y'])})
+
+
+def crime_left(aggregation, n=10000, seed=0):
+    """
+    Returns: a DataFrame of random districts, community areas and aggregated
+        dates to join the aggregation to
+    """
+    random = np.random.RandomState(seed)
+    return pd.DataFrame({'District': random.randint(1, 26, n),
+                         'Community Area': random.randint(1, 78, n),
+                         'date': pd.to_datetime(random.choice(aggregation.dates, n))})
+
+
+class Layer(Step):
+    def __init__(self, depth, index, inputs=None, **kwargs):
+        Step.__init__(self, depth=depth, index=index, inputs=inputs, **kwargs)
+
+
+def step_graph(width=100, depth=4, fan_in=2, seed=0):
+    """
+    Build a layered workflow like a model search, e.g. data feeding features
+    feeding transformations feeding models
+    Args:
+        width: number of steps in each layer
+        depth: number of layers
+        fan_in: number of inputs of each step, chosen at random from the previous layer
+    Returns: the last layer, whose steps and those in every other layer are targets
+    """
+    random = np.random.RandomState(seed)
+    layer = []
+    for d in range(depth):
+        previous = layer
+        layer = []
+        for i in range(width):
+            inputs = [previous[j] for j in random.choice(len(previous), fan_in)] \
+                if len(previous) > 0 else None
+            s = Layer(depth=d, index=i, inputs=inputs,
+                      parameters={'alpha': float(random.rand()), 'n': int(random.randint(100))})
+            s.target = (depth - d) % 2 == 1
+            layer.append(s)
+    return layer
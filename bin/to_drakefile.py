@@ -4,7 +4,7 @@ import argparse
 import logging
 import signal
 
-from drain import step, util, drake, serialize
+from drain import step, util, drake, serialize, catalog, cleanup, cache, profiling, schedule, distributed, stamps
 import drain
 
 workflows_help = "Each workflow is either: the name of a method returning either a drain Step object or collection thereof; or the path to a YAML serialization of a step."
@@ -45,6 +45,15 @@ if __name__ == "__main__":
     parser_exec.add_argument('--preview', action='store_true', help='Print the drake workflow that would run, then stops.')
     parser_exec.add_argument('--path', type=str, help='Output base directory. If not specified, use $DRAINPATH environment variable.')
     parser_exec.add_argument('-w', '--workflow', action='append', help=workflows_help, required=True)
+    parser_exec.add_argument('--content-hash', action='store_true', help='Rerun steps only when the content of their sources and dependencies changed, not their mtime. See also $DRAINCONTENTHASH.')
+    parser_exec.add_argument('--native', action='store_true', help='Run steps with the native scheduler instead of drake, packing them by their resource hints.')
+    parser_exec.add_argument('--cores', type=int, help='With --native, number of cores to use. Defaults to the number of CPUs.')
+    parser_exec.add_argument('--memory', type=str, help='With --native, memory to use, e.g. 200G. Defaults to the physical memory.')
+    parser_exec.add_argument('--force', action='store_true', help='With --native, run all steps, not just stale ones.')
+    parser_exec.add_argument('--fuse', action='store_true', help='With --native, run chains of steps in one process, passing results in memory and dumping them in the background.')
+    parser_exec.add_argument('--coordinator', type=str, help='With --native, run steps on workers connecting to this [host]:port, see drain worker. The host defaults to localhost, use 0.0.0.0 to accept remote workers. Requires the DRAINAUTHKEY environment variable.')
+    parser_exec.add_argument('--workers', type=int, default=1, help='With --coordinator, number of workers to wait for.')
+    parser_exec.add_argument('--cluster', type=int, help='With --native, run steps on this many local worker processes.')
    
     parser_list = subparsers.add_parser('list', help='Print step directories. Pipe into rm (for cleanup), du (for disk usage), etc.')
     parser_list.add_argument('--path', type=str, help='Output base directory. If not specified, use $DRAINPATH environment variable.')
@@ -52,14 +61,82 @@ if __name__ == "__main__":
     parser_list.add_argument('--invert', action='store_true', help='Print the inverse (complement) of the specified workflows.')
     parser_list.add_argument('-w', '--workflow', action='append', help=workflows_help, required=False)
     parser_list.add_argument('--leaf', action='store_true', help='With --workflow, only include leaves.')
+    parser_list.add_argument('--where', type=str, help='Only include steps in the catalog matching this SQL condition, e.g. "class = \'FitPredict\'".')
+
+    parser_status = subparsers.add_parser('status', help='Print the steps of the specified workflows that execute would run and why, without running them.')
+    parser_status.add_argument('--path', type=str, help='Output base directory. If not specified, use $DRAINPATH environment variable.')
+    parser_status.add_argument('-w', '--workflow', action='append', help=workflows_help, required=True)
+    parser_status.add_argument('--content-hash', action='store_true', help='Compare sources and dependencies by content, see execute --content-hash.')
+    parser_status.add_argument('--all', action='store_true', help='Also print steps that are up to date.')
+    parser_status.add_argument('--n-jobs', type=int, default=16, help='Number of threads used to stat files.')
+
+    parser_gc = subparsers.add_parser('gc', help='Delete step dumps which are not reachable from the specified workflows.')
+    parser_gc.add_argument('--path', type=str, help='Output base directory. If not specified, use $DRAINPATH environment variable.')
+    parser_gc.add_argument('-w', '--workflow', action='append', help=workflows_help, required=True)
+    parser_gc.add_argument('--budget', type=str, help='Only delete least recently used steps until the path uses at most this much space, e.g. 500G.')
+    parser_gc.add_argument('--min-age', type=float, help='Only delete steps not accessed in this many days.')
+    parser_gc.add_argument('--keep-yaml', action='store_true', help='Keep step.yaml, only delete dump/ and target.')
+    parser_gc.add_argument('--dry-run', action='store_true', help='Print the steps that would be deleted, then stop.')
+    parser_gc.add_argument('--n-jobs', type=int, default=8, help='Number of threads used to compute directory sizes.')
+
+    parser_catalog = subparsers.add_parser('catalog', help='Rebuild the catalog of dumped steps from their step.yaml files.')
+    parser_catalog.add_argument('--path', type=str, help='Output base directory. If not specified, use $DRAINPATH environment variable.')
+
+    parser_worker = subparsers.add_parser('worker', help='Run steps for a coordinator, see execute --coordinator.')
+    parser_worker.add_argument('--path', type=str, help=argparse.SUPPRESS)
+    parser_worker.add_argument('--coordinator', type=str, required=True, help='Address host:port of the coordinator. Requires the DRAINAUTHKEY environment variable.')
+    parser_worker.add_argument('--slots', type=int, default=1, help='Number of steps to run at a time.')
+
+    parser_profile = subparsers.add_parser('profile', help='Print the heaviest steps and the critical path of the specified workflows from their last execution.')
+    parser_profile.add_argument('--path', type=str, help='Output base directory. If not specified, use $DRAINPATH environment variable.')
+    parser_profile.add_argument('-w', '--workflow', action='append', help=workflows_help, required=True)
+    parser_profile.add_argument('--top', type=int, default=20, help='Number of heaviest steps to print.')
+
+    parser_cache = subparsers.add_parser('serve-cache', help='Serve a directory as a cache shared between machines, see DRAINCACHE.')
+    parser_cache.add_argument('--path', type=str, help=argparse.SUPPRESS)
+    parser_cache.add_argument('--root', type=str, required=True, help='Cache directory.')
+    parser_cache.add_argument('--host', type=str, default='', help='Address to listen on.')
+    parser_cache.add_argument('--port', type=int, default=8000, help='Port to listen on.')
 
     args, drake_args = parser.parse_known_args()
     if args.path:
         drain.PATH = os.path.abspath(args.path)
-    elif drain.PATH is None:
+    elif drain.PATH is None and args.command not in ('serve-cache', 'worker'):
         raise ValueError('Must pass path argument or set DRAINPATH environment variable')
+    if getattr(args, 'content_hash', False):
+        stamps.ENABLED = True
+
+    if args.command == 'execute' and args.native and not args.preview:
+        steps = parse_workflows(args.workflow)
+        memory = cleanup.parse_size(args.memory) if args.memory else None
+        cluster = None
+        if args.cluster:
+            cluster = distributed.local_cluster(args.cluster)
+            coordinator = cluster.__enter__()
+        elif args.coordinator:
+            coordinator = distributed.Coordinator(distributed.parse_address(args.coordinator))
+            logging.info('Waiting for %s workers on %s:%s' % ((args.workers,) + coordinator.address))
+            coordinator.wait_for_workers(args.workers, timeout=None)
+
+        if args.cluster or args.coordinator:
+            launcher = distributed.DistributedLauncher(coordinator)
+            cores = args.cores if args.cores else coordinator.slots
+        else:
+            launcher = schedule.SubprocessLauncher(bindir=os.path.dirname(os.path.abspath(__file__)))
+            cores = args.cores
+
+        try:
+            failed = schedule.Scheduler(cores=cores, memory=memory, launcher=launcher,
+                                        fuse=args.fuse).run(steps, force=args.force)
+        finally:
+            if cluster is not None:
+                cluster.__exit__(None, None, None)
+            elif args.coordinator:
+                coordinator.close()
+        if len(failed) > 0:
+            sys.exit(1)
 
-    if args.command == 'execute':
+    elif args.command == 'execute':
         steps = parse_workflows(args.workflow)
         if args.drakefile is None and not args.ignore_drakefile and os.path.exists('Drakefile'):
             args.drakefile = 'Drakefile'
@@ -96,6 +173,11 @@ if __name__ == "__main__":
         if args.workflow is not None:
             steps = parse_workflows(args.workflow)
             dirs = step._output_dirnames(steps, leaf=args.leaf)
+            if args.where is not None:
+                dirs = catalog.dirnames(args.where).intersection(dirs)
+        elif args.where is not None:
+            # indexed lookup instead of scanning the path
+            dirs = catalog.dirnames(args.where)
         else:
             dirs = step._output_dirnames()
 
@@ -108,3 +190,53 @@ if __name__ == "__main__":
         signal.signal(signal.SIGPIPE, signal.SIG_DFL)
         for d in dirs:
             print(d)
+
+    elif args.command == 'status':
+        steps = parse_workflows(args.workflow)
+        reasons = drake.status(drake.get_drake_data(steps), n_jobs=args.n_jobs)
+
+        signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+        for s in sorted(reasons, key=lambda s: s._output_dirname):
+            if len(reasons[s]) > 0:
+                print('%s\t%s' % (s._output_dirname, str.join('; ', reasons[s])))
+            elif args.all:
+                print('%s\tup to date' % s._output_dirname)
+        logging.info('%s of %s steps would run' % (
+                sum(1 for r in reasons.values() if len(r) > 0), len(reasons)))
+
+    elif args.command == 'gc':
+        steps = parse_workflows(args.workflow)
+        budget = cleanup.parse_size(args.budget) if args.budget else None
+        min_age = args.min_age*86400 if args.min_age else None
+        evicted = cleanup.collect(steps, budget=budget, min_age=min_age,
+                                  keep_yaml=args.keep_yaml, dry_run=args.dry_run,
+                                  n_jobs=args.n_jobs)
+
+        signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+        for d, size in evicted:
+            print('%s\t%s' % (size, d))
+        logging.info('%s %s steps using %s bytes' % (
+                'Would delete' if args.dry_run else 'Deleted',
+                len(evicted), sum(size for d, size in evicted)))
+
+    elif args.command == 'catalog':
+        catalog.rebuild()
+
+    elif args.command == 'profile':
+        steps = parse_workflows(args.workflow)
+        df = profiling.report(steps)
+
+        signal.signal(signal.SIGPIPE, signal.SIG_DFL)
+        print('Heaviest steps (seconds, bytes):')
+        print(df.head(args.top).to_string())
+
+        path, total = profiling.critical_path(steps)
+        print('\nCritical path (%.1f seconds):' % total)
+        for s in path:
+            print('%s\t%s' % (profiling.duration(profiling.read(s)), s._output_dirname))
+
+    elif args.command == 'worker':
+        distributed.Worker(distributed.parse_address(args.coordinator), slots=args.slots).run()
+
+    elif args.command == 'serve-cache':
+        cache.serve(args.root, host=args.host, port=args.port)
@@ -1,6 +1,12 @@
 import logging
 import os
-from . import serialize
+import yaml
+
+# Optional and heavy dependencies, e.g. sklearn, PyTables and SQLAlchemy, are
+# imported by the functions which use them, so that importing drain, which
+# every run_step.py process does, stays fast. Modules only needed for an
+# environment variable below are imported when it is set. See tests/test_import.py.
+from . import serialize, step
 from .exploration import explore  # noqa: F401
 
 logging.basicConfig(format='%(asctime)s %(levelname)s: %(message)s', level=0)
@@ -12,4 +18,28 @@ if 'DRAINPATH' in os.environ:
 else:
     PATH = None
 
+# a YAML mapping, e.g. "{codec: zstd, level: 5}", see step.hdf_args()
+if 'DRAINSTORAGE' in os.environ:
+    step.STORAGE.update(yaml.safe_load(os.environ['DRAINSTORAGE']))
+
+# e.g. 4G, the size of results queued for a background dump, see step.Dumper
+if 'DRAINDUMPBYTES' in os.environ:
+    from . import cleanup
+    step.DUMP_MAXBYTES = cleanup.parse_size(os.environ['DRAINDUMPBYTES'])
+
+# compare sources and dependencies by content instead of mtime, see stamps
+if os.environ.get('DRAINCONTENTHASH', '') not in ('', '0'):
+    from . import stamps
+    stamps.ENABLED = True
+
+# a directory or URL of a cache shared between machines
+if 'DRAINCACHE' in os.environ:
+    from . import cache
+    cache.configure(os.environ['DRAINCACHE'])
+
+# the shared secret of a coordinator and its workers, see distributed
+if 'DRAINAUTHKEY' in os.environ:
+    from . import distributed
+    distributed.AUTHKEY = os.environ['DRAINAUTHKEY']
+
 __version__ = '0.0.6'
@@ -15,6 +15,11 @@ class AggregationBase(Step):
     parallel and can be returned disjoint or concatenated. Finally
     the results may be pivoted and joined to other datasets.
     """
+    # results are typically many frames, dump them to one file each. HDF5 is not
+    # thread-safe, so to dump and load them in parallel set e.g.
+    # storage = {'layout': 'split', 'n_jobs': 4, 'backend': 'loky'} on a subclass
+    storage = {'layout': 'split'}
+
     def __init__(self, insert_args, aggregator_args, concat_args,
                  parallel=False, prefix=None, inputs=None):
         """
@@ -173,9 +178,9 @@ class AggregationBase(Step):
 
             return tuple(dfs)
 
-    def load(self):
+    def load(self, **kwargs):
         # overload load in order to restore result to a tuple
-        Step.load(self)
+        Step.load(self, **kwargs)
         self.result = tuple(self.result)
 
     def get_concat_result(self):
@@ -237,6 +242,9 @@ class SpacetimeAggregationJoin(AggregationJoin):
     Specify a temporal lag between the aggregations and left
     Useful for simulating a delay in receipt of aggregation data sources
     """
+    # the lag is applied to the aggregations in place
+    modifies_inputs = True
+
     def __init__(self, inputs, lag=None, **kwargs):
         AggregationJoin.__init__(self, lag=lag, inputs=inputs, **kwargs)
 
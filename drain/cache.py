@@ -0,0 +1,372 @@
+"""
+A cache of step dumps shared between machines and keyed by step digest.
+Step.execute() fetches its output step from the cache instead of running it
+and stores the output in the cache after dumping it.
+
+The cache is configured by the DRAINCACHE environment variable, which is
+either a directory, e.g. on a shared filesystem, or the URL of an HTTP
+server supporting GET with Range requests and PUT, such as serve().
+
+Each entry is a tar archive of a step's step.yaml and dump/ directory stored
+as {digest}.tar, and a manifest {digest}.yaml with the archive's size and
+sha256 hash. The manifest is stored last, so an entry without one is ignored.
+"""
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+
+import joblib
+import yaml
+from six.moves import BaseHTTPServer, socketserver
+from six.moves.urllib.error import HTTPError
+from six.moves.urllib.request import Request, urlopen
+
+from . import util
+
+# the cache used by Step.execute(), see configure()
+CACHE = None
+
+_BLOCKSIZE = 2**20
+
+
+def configure(location):
+    """
+    Set the cache used by Step.execute()
+    Args:
+        location: a directory or an http(s) URL, or None to disable the cache
+    Returns: the RemoteCache
+    """
+    global CACHE
+    if location is None:
+        CACHE = None
+    elif re.match('https?://', location):
+        CACHE = HTTPCache(location)
+    else:
+        CACHE = FileSystemCache(location)
+    return CACHE
+
+
+def get(step):
+    """
+    Fetch a step's dump from the configured cache into step._dump_dirname.
+    Failures are logged, not raised, and count as a miss.
+    Returns: whether the dump was fetched
+    """
+    if CACHE is None:
+        return False
+    try:
+        return CACHE.get(step)
+    except Exception as e:
+        logging.warning('Could not fetch %s from cache: %s' % (step._digest, e))
+        return False
+
+
+def put(step):
+    """
+    Store a dumped step in the configured cache. Failures are logged, not raised.
+    """
+    if CACHE is None:
+        return
+    try:
+        CACHE.put(step)
+    except Exception as e:
+        logging.warning('Could not store %s in cache: %s' % (step._digest, e))
+
+
+def sha256(filename):
+    """
+    Returns: the hex sha256 hash of the file's contents
+    """
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for block in iter(lambda: f.read(_BLOCKSIZE), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _copy(src, dst, length):
+    """
+    Copy length bytes between file objects
+    """
+    while length > 0:
+        block = src.read(min(_BLOCKSIZE, length))
+        if not block:
+            raise IOError('Unexpected end of stream')
+        dst.write(block)
+        length -= len(block)
+
+
+class RemoteCache(object):
+    """
+    Base class for caches. Subclasses implement storage of archives and
+    manifests by digest.
+    """
+    def get(self, step):
+        """
+        Fetch a step's dump into step._dump_dirname, which must be an empty directory
+        Returns: whether the step was in the cache
+        """
+        manifest = self._get_manifest(step._digest)
+        if manifest is None:
+            return False
+
+        logging.info('Fetching %s (%s bytes) from cache' % (step._digest, manifest['size']))
+        # extract beside the dump directory and then rename it into place
+        tempdir = tempfile.mkdtemp(prefix='.cache-', dir=step._output_dirname)
+        try:
+            filename = os.path.join(tempdir, 'dump.tar')
+            self._get_archive(step._digest, filename, manifest['size'])
+            if sha256(filename) != manifest['sha256']:
+                raise ValueError('Hash of cached archive does not match its manifest')
+
+            self._extract(filename, os.path.join(tempdir, 'dump'))
+            os.rmdir(step._dump_dirname)
+            os.rename(os.path.join(tempdir, 'dump'), step._dump_dirname)
+        finally:
+            shutil.rmtree(tempdir)
+
+        return True
+
+    def put(self, step):
+        """
+        Store a dumped step in the cache
+        """
+        fd, filename = tempfile.mkstemp(prefix='.cache-', suffix='.tar',
+                                        dir=step._output_dirname)
+        os.close(fd)
+        try:
+            with tarfile.open(filename, 'w') as tar:
+                tar.add(step._yaml_filename, arcname='step.yaml')
+                tar.add(step._dump_dirname, arcname='dump')
+
+            manifest = {'size': os.path.getsize(filename), 'sha256': sha256(filename)}
+            self._put_archive(step._digest, filename)
+            self._put_manifest(step._digest, manifest)
+        finally:
+            os.remove(filename)
+
+    @staticmethod
+    def _extract(filename, dirname):
+        """
+        Extract the dump/ directory of an archive into dirname
+        """
+        os.makedirs(dirname)
+        with tarfile.open(filename, 'r') as tar:
+            for member in tar.getmembers():
+                path = os.path.normpath(member.name)
+                if os.path.isabs(path) or path.startswith('..'):
+                    raise ValueError('Invalid path in archive: %s' % member.name)
+                if not path.startswith('dump' + os.sep):
+                    continue
+                path = os.path.join(dirname, os.path.relpath(path, 'dump'))
+
+                if member.isdir():
+                    if not os.path.isdir(path):
+                        os.makedirs(path)
+                elif member.isfile():
+                    if not os.path.isdir(os.path.dirname(path)):
+                        os.makedirs(os.path.dirname(path))
+                    with open(path, 'wb') as f:
+                        shutil.copyfileobj(tar.extractfile(member), f)
+
+    def _get_manifest(self, digest):
+        """
+        Returns: the manifest dict of the digest, or None if it is not cached
+        """
+        raise NotImplementedError
+
+    def _get_archive(self, digest, filename, size):
+        raise NotImplementedError
+
+    def _put_archive(self, digest, filename):
+        raise NotImplementedError
+
+    def _put_manifest(self, digest, manifest):
+        raise NotImplementedError
+
+
+class FileSystemCache(RemoteCache):
+    """
+    A cache in a directory, e.g. on a filesystem shared between machines
+    """
+    def __init__(self, root):
+        self.root = root
+
+    def _filename(self, digest, extension):
+        return os.path.join(self.root, digest[:2], digest + extension)
+
+    def _get_manifest(self, digest):
+        filename = self._filename(digest, '.yaml')
+        if not os.path.isfile(filename):
+            return None
+        with open(filename) as f:
+            return yaml.safe_load(f)
+
+    def _get_archive(self, digest, filename, size):
+        shutil.copyfile(self._filename(digest, '.tar'), filename)
+
+    def _put_archive(self, digest, filename):
+        dst = self._filename(digest, '.tar')
+        if not os.path.isdir(os.path.dirname(dst)):
+            os.makedirs(os.path.dirname(dst))
+        tmp_filename = '%s.tmp-%s' % (dst, os.getpid())
+        shutil.copyfile(filename, tmp_filename)
+        os.rename(tmp_filename, dst)
+
+    def _put_manifest(self, digest, manifest):
+        util.atomic_write(self._filename(digest, '.yaml'), yaml.safe_dump(manifest))
+
+
+class HTTPCache(RemoteCache):
+    """
+    A cache on an HTTP server supporting GET with Range requests and PUT.
+    Archives are downloaded in chunks in parallel.
+    """
+    def __init__(self, url, n_jobs=4, chunksize=2**26, timeout=60):
+        """
+        Args:
+            url: the base URL
+            n_jobs: number of chunks to download at a time
+            chunksize: size of the chunks in bytes
+            timeout: timeout of each request in seconds
+        """
+        self.url = url.rstrip('/')
+        self.n_jobs = n_jobs
+        self.chunksize = chunksize
+        self.timeout = timeout
+
+    def _url(self, digest, extension):
+        return '%s/%s/%s%s' % (self.url, digest[:2], digest, extension)
+
+    def _get_manifest(self, digest):
+        try:
+            response = urlopen(self._url(digest, '.yaml'), timeout=self.timeout)
+        except HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+        return yaml.safe_load(response.read())
+
+    def _get_chunk(self, url, filename, start, end):
+        request = Request(url, headers={'Range': 'bytes=%s-%s' % (start, end)})
+        response = urlopen(request, timeout=self.timeout)
+        if response.getcode() != 206 and (start, end + 1) != (0, os.path.getsize(filename)):
+            raise IOError('Server does not support range requests')
+        with open(filename, 'r+b') as f:
+            f.seek(start)
+            _copy(response, f, end - start + 1)
+
+    def _get_archive(self, digest, filename, size):
+        # allocate the file so that chunks can be written in any order
+        with open(filename, 'wb') as f:
+            f.truncate(size)
+
+        url = self._url(digest, '.tar')
+        joblib.Parallel(n_jobs=self.n_jobs, backend='threading')(
+                joblib.delayed(self._get_chunk)(
+                    url, filename, start, min(start + self.chunksize, size) - 1)
+                for start in range(0, size, self.chunksize))
+
+    def _put(self, url, data, length):
+        request = Request(url, data=data, headers={'Content-Length': str(length)})
+        request.get_method = lambda: 'PUT'
+        urlopen(request, timeout=self.timeout).read()
+
+    def _put_archive(self, digest, filename):
+        with open(filename, 'rb') as f:
+            self._put(self._url(digest, '.tar'), f, os.path.getsize(filename))
+
+    def _put_manifest(self, digest, manifest):
+        data = yaml.safe_dump(manifest).encode('utf-8')
+        self._put(self._url(digest, '.yaml'), data, len(data))
+
+
+class CacheRequestHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Serves files in server.root with GET, HEAD (including Range requests) and PUT
+    """
+    def _filename(self):
+        path = os.path.normpath(self.path.split('?')[0].lstrip('/'))
+        if path.startswith('..') or os.path.isabs(path):
+            return None
+        return os.path.join(self.server.root, path)
+
+    def do_HEAD(self):
+        self._get(body=False)
+
+    def do_GET(self):
+        self._get(body=True)
+
+    def _get(self, body):
+        filename = self._filename()
+        if filename is None or not os.path.isfile(filename):
+            self.send_error(404)
+            return
+
+        size = os.path.getsize(filename)
+        start, end = 0, size - 1
+        match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if match:
+            start = int(match.group(1))
+            if match.group(2):
+                end = min(int(match.group(2)), end)
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %s-%s/%s' % (start, end, size))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+        if body:
+            with open(filename, 'rb') as f:
+                f.seek(start)
+                _copy(f, self.wfile, end - start + 1)
+
+    def do_PUT(self):
+        filename = self._filename()
+        if filename is None:
+            self.send_error(403)
+            return
+
+        if not os.path.isdir(os.path.dirname(filename)):
+            os.makedirs(os.path.dirname(filename))
+        # write to a temporary file so that readers never see a partial file
+        tmp_filename = '%s.tmp-%s' % (filename, id(self))
+        with open(tmp_filename, 'wb') as f:
+            _copy(self.rfile, f, int(self.headers['Content-Length']))
+        os.rename(tmp_filename, filename)
+
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+
+class CacheServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    """
+    A minimal HTTP server for an HTTPCache, e.g. for testing or a small team
+    """
+    daemon_threads = True
+
+    def __init__(self, root, host='', port=0):
+        self.root = root
+        BaseHTTPServer.HTTPServer.__init__(self, (host, port), CacheRequestHandler)
+
+
+def serve(root, host='', port=8000):
+    """
+    Serve a cache directory over HTTP until interrupted
+    """
+    server = CacheServer(root, host=host, port=port)
+    logging.info('Serving cache %s on port %s' % (root, server.server_address[1]))
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
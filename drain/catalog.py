@@ -0,0 +1,148 @@
+"""
+A SQLite catalog of the steps dumped in drain.PATH. Steps are recorded
+when they are dumped by Step.execute() so that historical runs can be
+listed and filtered without deserializing every step.yaml.
+"""
+import json
+import logging
+import os
+import sqlite3
+import time
+
+import drain
+from . import util
+
+# hidden so that it is not mistaken for a step class directory
+FILENAME = '.catalog.sqlite'
+
+COLUMNS = ['digest', 'class', 'name', 'dirname', 'kwargs', 'inputs',
+           'target', 'dump_size', 'run_time', 'dump_time', 'dumped']
+
+_SCHEMA = """CREATE TABLE IF NOT EXISTS steps (
+    digest TEXT PRIMARY KEY,
+    class TEXT,
+    name TEXT,
+    dirname TEXT,
+    kwargs TEXT,
+    inputs TEXT,
+    target TEXT,
+    dump_size INTEGER,
+    run_time REAL,
+    dump_time REAL,
+    dumped REAL
+)"""
+
+
+def connect(path=None):
+    """
+    Returns: a connection to the catalog in path, default drain.PATH
+    """
+    if path is None:
+        path = drain.PATH
+    if path is None:
+        raise ValueError('drain.PATH not set')
+
+    # concurrent run_step.py processes may be writing
+    conn = sqlite3.connect(os.path.join(path, FILENAME), timeout=60)
+    conn.row_factory = sqlite3.Row
+    conn.execute(_SCHEMA)
+    conn.execute('CREATE INDEX IF NOT EXISTS steps_class ON steps (class)')
+    return conn
+
+
+def flatten_kwargs(step):
+    """
+    Returns: the step's kwargs minus input steps, with dicts expanded and keys
+        joined by '.', as a JSON string
+    """
+    from .step import Step
+
+    kwargs = {k: v for k, v in step._kwargs.items()
+              if not (isinstance(v, Step) or util.is_instance_collection(v, Step))}
+    kwargs = {str.join('.', map(str, util.make_tuple(k))): v
+              for k, v in util.dict_expand(kwargs).items()}
+    return json.dumps(kwargs, sort_keys=True, default=str)
+
+
+def record(step, run_time=None, dump_time=None, dumped=None):
+    """
+    Record a dumped step in the catalog. Failures are logged, not raised,
+    since the catalog is only an index of the dumps.
+    Args:
+        step: the dumped step
+        run_time, dump_time: durations in seconds, if known. run_time includes
+            the non-target inputs run with the step, see profiling.summarize()
+        dumped: time of the dump, defaults to now
+    """
+    try:
+        row = (step._digest, step.__class__.__name__, step.name,
+               step._output_dirname, flatten_kwargs(step),
+               json.dumps([i._digest for i in step.inputs]),
+               step._target_filename, util.dir_size(step._dump_dirname),
+               run_time, dump_time, dumped if dumped is not None else time.time())
+        conn = connect()
+        with conn:
+            conn.execute('INSERT OR REPLACE INTO steps (%s) VALUES (%s)' % (
+                    str.join(', ', COLUMNS), str.join(', ', ['?']*len(COLUMNS))), row)
+        conn.close()
+    except (sqlite3.Error, IOError, OSError) as e:
+        logging.warning('Could not record step in catalog: %s' % e)
+
+
+def forget(dirnames, path=None):
+    """
+    Remove the steps with the given output directories from the catalog
+    """
+    conn = connect(path)
+    with conn:
+        conn.executemany('DELETE FROM steps WHERE dirname = ?',
+                         [(d,) for d in dirnames])
+    conn.close()
+
+
+def query(where=None, params=(), path=None):
+    """
+    Query the catalog
+    Args:
+        where: optional SQL condition on the columns in COLUMNS,
+            e.g. "class = 'FitPredict' AND dump_size > 1e9"
+        params: parameters for placeholders in where
+        path: drain path, defaults to drain.PATH
+    Returns: a list of dicts
+    """
+    sql = 'SELECT * FROM steps'
+    if where is not None:
+        sql += ' WHERE ' + where
+
+    conn = connect(path)
+    rows = [dict(r) for r in conn.execute(sql, params)]
+    conn.close()
+    return rows
+
+
+def dirnames(where=None, params=(), path=None):
+    """
+    Returns: the set of output directories of the steps matching where
+    """
+    return set(r['dirname'] for r in query(where, params, path))
+
+
+def rebuild():
+    """
+    Record every completed step in drain.PATH, e.g. those dumped before the
+    catalog existed. Timings of those steps are unknown.
+    """
+    from . import serialize, step
+
+    for dirname in step._output_dirnames():
+        yaml_filename = os.path.join(dirname, 'step.yaml')
+        target_filename = os.path.join(dirname, 'target')
+        if not os.path.exists(target_filename):
+            continue
+        try:
+            s = serialize.load(yaml_filename)
+        except Exception as e:
+            logging.warning('Could not load %s: %s' % (yaml_filename, e))
+            continue
+
+        record(s, dumped=os.path.getmtime(target_filename))
@@ -0,0 +1,135 @@
+"""
+Garbage collection of the step dumps in drain.PATH that are not reachable
+from a given workflow. Used by the 'drain gc' command.
+"""
+import logging
+import os
+import re
+import shutil
+import time
+
+import joblib
+
+from . import util, step, catalog, drake
+
+_SIZE_UNITS = {'': 1, 'K': 2**10, 'M': 2**20, 'G': 2**30, 'T': 2**40}
+
+
+def parse_size(s):
+    """
+    Parse a size string such as '500M' or '1.5T' into a number of bytes
+    """
+    match = re.match(r'^\s*([0-9.]+)\s*([KMGT]?)B?\s*$', str(s).upper())
+    if match is None:
+        raise ValueError('Invalid size: %s' % s)
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2)])
+
+
+def last_access(dirname):
+    """
+    Returns: the most recent access or modification time of any file in the
+        directory tree. Note that filesystems mounted with noatime only
+        update access times on modification.
+    """
+    t = os.stat(dirname).st_mtime
+    for root, dirs, files in os.walk(dirname):
+        for f in files:
+            st = os.stat(os.path.join(root, f))
+            t = max(t, st.st_atime, st.st_mtime)
+    return t
+
+
+def _dir_stats(dirname):
+    return util.dir_size(dirname), last_access(dirname)
+
+
+def dir_stats(dirnames, n_jobs=8):
+    """
+    Computes sizes and last access times of the given directories in parallel
+    Returns: a dict of dirname: (size, last access time)
+    """
+    dirnames = list(dirnames)
+    stats = joblib.Parallel(n_jobs=n_jobs, backend='threading')(
+            joblib.delayed(_dir_stats)(d) for d in dirnames)
+    return dict(zip(dirnames, stats))
+
+
+def select(stats, reachable, budget=None, min_age=None):
+    """
+    Select unreachable directories to evict, least recently accessed first
+    Args:
+        stats: dict of dirname: (size, last access time) for all directories
+        reachable: collection of directories which must not be evicted
+        budget: if specified, only evict until the total size of all
+            directories is at most this many bytes
+        min_age: if specified, only evict directories not accessed for
+            this many seconds
+    Returns: a list of directories to evict
+    """
+    candidates = [d for d in stats if d not in reachable]
+    if min_age is not None:
+        now = time.time()
+        candidates = [d for d in candidates if now - stats[d][1] >= min_age]
+    candidates.sort(key=lambda d: stats[d][1])
+
+    if budget is None:
+        return candidates
+
+    total = sum(size for size, accessed in stats.values())
+    evict = []
+    for d in candidates:
+        if total <= budget:
+            break
+        evict.append(d)
+        total -= stats[d][0]
+
+    if total > budget:
+        logging.warning('Cannot meet budget of %s bytes without evicting reachable steps'
+                        % budget)
+
+    return evict
+
+
+def evict(dirname, keep_yaml=False):
+    """
+    Delete a step's output directory
+    Args:
+        keep_yaml: only delete the dump and target, keeping step.yaml
+            so the step can still be identified and rerun
+    """
+    if keep_yaml:
+        target = os.path.join(dirname, 'target')
+        # remove the target first so the step is never complete without a dump
+        if os.path.exists(target):
+            os.remove(target)
+        dump = os.path.join(dirname, 'dump')
+        if os.path.exists(dump):
+            shutil.rmtree(dump)
+    else:
+        shutil.rmtree(dirname)
+
+
+def collect(workflow, budget=None, min_age=None, keep_yaml=False, dry_run=False,
+            n_jobs=8):
+    """
+    Evict step dumps in drain.PATH which are not reachable from the workflow
+    Args:
+        workflow: collection of steps whose target inputs must be kept
+        budget, min_age: see select()
+        keep_yaml: see evict()
+        dry_run: only return what would be evicted
+        n_jobs: number of threads used to compute directory sizes
+    Returns: a list of (dirname, size) pairs which were evicted
+    """
+    # every output drake would run or load, including the target inputs of
+    # workflow steps which are not targets themselves
+    reachable = set(s._output_dirname for s in drake.get_drake_data(workflow))
+    stats = dir_stats(step._output_dirnames(), n_jobs=n_jobs)
+    evicted = [(d, stats[d][0]) for d in select(stats, reachable, budget, min_age)]
+
+    if not dry_run:
+        for d, size in evicted:
+            evict(d, keep_yaml=keep_yaml)
+        catalog.forget([d for d, size in evicted])
+
+    return evicted
@@ -13,8 +13,6 @@ from dateutil.relativedelta import relativedelta
 
 import collections
 
-from sklearn import datasets
-from sklearn.utils.validation import _assert_all_finite
 
 from .step import Step, MapResults
 
@@ -64,6 +62,8 @@ class Column(object):
 
 class ClassificationData(Step):
     def run(self):
+        from sklearn import datasets
+
         X, y = datasets.make_classification(
                 **self.get_arguments(inputs=False, dependencies=False))
         X, y = pd.DataFrame(X), pd.Series(y)
@@ -173,6 +173,11 @@ class ToHDF(Step):
         Step.__init__(self, objects_to_ascii=objects_to_ascii, **kwargs)
         self._target = True
 
+    @property
+    def modifies_inputs(self):
+        # objects_to_ascii encodes the input frames' columns in place
+        return self.objects_to_ascii
+
     def run(self, **kwargs):
         store = pd.HDFStore(os.path.join(self._dump_dirname, 'result.h5'))
 
@@ -192,7 +197,9 @@ class ToHDF(Step):
     def dump(self):
         return
 
-    def load(self):
+    def load(self, columns=None, where=None):
+        # the result is the store itself, which consumers select from,
+        # so columns and where from get_load_args() are ignored
         self.result = pd.HDFStore(os.path.join(self._dump_dirname, 'result.h5'), mode='r')
 
 
@@ -434,6 +441,8 @@ def null_columns(df, train=None):
 
 
 def infinite_columns(df):
+    from sklearn.utils.validation import _assert_all_finite
+
     columns = []
     for c in df.columns:
         try:
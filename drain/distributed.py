@@ -0,0 +1,339 @@
+"""
+Distributed execution of the target steps of a workflow on a cluster of
+workers sharing drain.PATH, e.g. over NFS. A Coordinator serves a task queue
+per worker and a result queue with a multiprocessing manager. The native
+scheduler (see schedule.Scheduler) launches each step through a
+DistributedLauncher, which places it on a worker, preferring the worker that
+produced most of its inputs, whose dumps are likely still in its page cache.
+Each Worker runs its tasks in forked processes as bin/run_step.py would.
+
+The manager exchanges pickles, so anyone who can connect to it can run code
+on the coordinator and workers. They authenticate with a shared secret, which
+must be set in the DRAINAUTHKEY environment variable, and the coordinator
+listens on localhost unless a host is given, e.g. 0.0.0.0 for all interfaces.
+
+Workers send a heartbeat every HEARTBEAT_INTERVAL seconds. A worker which is
+not heard from for HEARTBEAT_TIMEOUT seconds, e.g. because its machine
+failed, is dropped and its running tasks fail.
+
+To run a cluster:
+    export DRAINAUTHKEY=...   # on each machine
+    drain worker --coordinator host:port --slots 8   # on each worker machine
+    drain execute --native --coordinator 0.0.0.0:port -w workflow   # on the coordinator
+For testing, local_cluster() simulates a cluster with local processes.
+"""
+import binascii
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from multiprocessing.managers import BaseManager
+
+from six.moves import queue
+
+from . import drake, schedule
+
+# the shared secret, set from the DRAINAUTHKEY environment variable in drain/__init__.py
+AUTHKEY = None
+
+# seconds between heartbeats of a worker and after which a silent worker is dropped
+HEARTBEAT_INTERVAL = 5
+HEARTBEAT_TIMEOUT = 60
+
+
+def get_authkey(authkey=None):
+    """
+    Returns: the given authkey or else AUTHKEY, as bytes
+    """
+    if authkey is None:
+        authkey = AUTHKEY
+    if not authkey:
+        raise ValueError('Set the DRAINAUTHKEY environment variable to a shared secret')
+    if not isinstance(authkey, bytes):
+        authkey = authkey.encode('utf-8')
+    return authkey
+
+
+def parse_address(address):
+    """
+    Parse 'host:port' into a pair. The host defaults to localhost.
+    """
+    host, port = address.rsplit(':', 1)
+    return host or 'localhost', int(port)
+
+
+class Coordinator(object):
+    """
+    Serves the queues used to dispatch tasks to workers and collect their results
+    """
+    def __init__(self, address=('localhost', 0), authkey=None):
+        """
+        Args:
+            address: the (host, port) to listen on
+            authkey: the shared secret, defaults to AUTHKEY
+        """
+        self.workers = {}
+        self._heartbeats = {}
+        self._tasks = {}
+        self._results = queue.Queue()
+        self._lock = threading.Lock()
+
+        # register on a new class so that each coordinator serves its own queues
+        class Manager(BaseManager):
+            pass
+        Manager.register('add_worker', callable=self._add_worker)
+        Manager.register('get_tasks', callable=lambda worker_id: self._tasks[worker_id])
+        Manager.register('get_results', callable=lambda: self._results)
+        Manager.register('heartbeat', callable=self._heartbeat)
+
+        self._server = Manager(address=address, authkey=get_authkey(authkey)).get_server()
+        self.address = self._server.address
+        thread = threading.Thread(target=self._server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def _add_worker(self, worker_id, slots):
+        with self._lock:
+            self._tasks[worker_id] = queue.Queue()
+            self.workers[worker_id] = slots
+            self._heartbeats[worker_id] = time.time()
+        logging.info('Registered worker %s with %s slots' % (worker_id, slots))
+
+    def _heartbeat(self, worker_id):
+        self._heartbeats[worker_id] = time.time()
+
+    def dead_workers(self, timeout=None):
+        """
+        Args:
+            timeout: seconds without a heartbeat, defaults to HEARTBEAT_TIMEOUT
+        Returns: the workers which have not sent a heartbeat within the timeout
+        """
+        if timeout is None:
+            timeout = HEARTBEAT_TIMEOUT
+        now = time.time()
+        return [w for w in list(self.workers) if now - self._heartbeats[w] > timeout]
+
+    def remove_worker(self, worker_id):
+        """
+        Stop placing tasks on a worker
+        """
+        with self._lock:
+            del self.workers[worker_id]
+        logging.error('Lost worker %s' % worker_id)
+
+    @property
+    def slots(self):
+        return sum(self.workers.values())
+
+    def wait_for_workers(self, n, timeout=60):
+        """
+        Wait until n workers have registered
+        Args:
+            timeout: seconds to wait before raising an error, None to wait forever
+        """
+        start = time.time()
+        while len(self.workers) < n:
+            if timeout is not None and time.time() - start > timeout:
+                raise RuntimeError('Only %s of %s workers registered' % (len(self.workers), n))
+            time.sleep(0.1)
+
+    def submit(self, worker_id, task_id, args):
+        """
+        Queue run_step arguments on a worker
+        """
+        self._tasks[worker_id].put((task_id, args))
+
+    def results(self):
+        """
+        Returns: a list of (task_id, worker_id, exit code) of the tasks finished
+            since the last call
+        """
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def close(self):
+        """
+        Stop the workers
+        """
+        for tasks in self._tasks.values():
+            tasks.put(None)
+
+
+def _run_task(args, log_filename):
+    # redirect output to the step's log as in the drain() drake method
+    fd = os.open(log_filename, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    os.dup2(fd, 1)
+    os.dup2(fd, 2)
+    os.close(fd)
+    drake.run_step(args)
+
+
+class Worker(object):
+    def __init__(self, address, authkey=None, slots=1, worker_id=None):
+        """
+        Args:
+            address: the (host, port) of the coordinator
+            authkey: the shared secret, defaults to AUTHKEY
+            slots: number of tasks to run at a time
+            worker_id: a unique name, defaults to hostname:pid
+        """
+        self.address = address
+        self.authkey = get_authkey(authkey)
+        self.slots = slots
+        self.worker_id = worker_id if worker_id is not None else \
+            '%s:%s' % (socket.gethostname(), os.getpid())
+
+    def run(self):
+        """
+        Run tasks until the coordinator closes
+        """
+        class Manager(BaseManager):
+            pass
+        for name in ('add_worker', 'get_tasks', 'get_results', 'heartbeat'):
+            Manager.register(name)
+
+        manager = Manager(address=self.address, authkey=self.authkey)
+        manager.connect()
+        manager.add_worker(self.worker_id, self.slots)
+        tasks = manager.get_tasks(self.worker_id)
+        results = manager.get_results()
+        stopped = threading.Event()
+
+        def heartbeat():
+            while not stopped.wait(HEARTBEAT_INTERVAL):
+                manager.heartbeat(self.worker_id)
+        heartbeat_thread = threading.Thread(target=heartbeat)
+        heartbeat_thread.daemon = True
+        heartbeat_thread.start()
+
+        def loop():
+            while True:
+                task = tasks.get()
+                if task is None:
+                    # let the other threads stop too
+                    tasks.put(None)
+                    return
+                task_id, args = task
+                step_filename = [a for a in args if drake.is_step_filename(a)][0]
+                log_filename = os.path.join(os.path.dirname(step_filename), 'drain.log')
+                process = multiprocessing.Process(target=_run_task, args=(args, log_filename))
+                process.start()
+                process.join()
+                results.put((task_id, self.worker_id, process.exitcode))
+
+        threads = [threading.Thread(target=loop) for i in range(self.slots)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        stopped.set()
+
+
+class Task(object):
+    """
+    A task running on a worker, polled by the scheduler like a subprocess.Popen
+    """
+    def __init__(self, launcher, task_id):
+        self.launcher = launcher
+        self.task_id = task_id
+
+    def poll(self):
+        return self.launcher._poll(self.task_id)
+
+
+class DistributedLauncher(object):
+    """
+    Launches steps on the workers of a Coordinator, for schedule.Scheduler
+    """
+    def __init__(self, coordinator, heartbeat_timeout=None):
+        """
+        Args:
+            heartbeat_timeout: seconds after which a silent worker is dropped and
+                its running tasks fail, defaults to HEARTBEAT_TIMEOUT
+        """
+        self.coordinator = coordinator
+        self.heartbeat_timeout = heartbeat_timeout
+        # the worker which produced each output directory
+        self.locations = {}
+        self._tasks = {}
+        self._exit_codes = {}
+        self._assigned = {}
+
+    def place(self, step, inputs):
+        """
+        Choose a worker for a step: a worker with a free slot if possible,
+        then the one which produced the most inputs, then the least busy one
+        Returns: the worker id
+        """
+        def score(worker_id):
+            free = self.coordinator.workers[worker_id] - self._assigned.get(worker_id, 0)
+            local = sum(1 for i in inputs if self.locations.get(i._output_dirname) == worker_id)
+            return (free > 0, local, free)
+
+        return max(sorted(self.coordinator.workers), key=score)
+
+    def __call__(self, step, inputs, outputs=None):
+        worker_id = self.place(step, inputs)
+        task_id = len(self._tasks)
+        self._tasks[task_id] = (outputs if outputs is not None else [step], worker_id)
+        self._assigned[worker_id] = self._assigned.get(worker_id, 0) + 1
+        self.coordinator.submit(worker_id, task_id,
+                                schedule.run_step_args(step, inputs, outputs))
+        return Task(self, task_id)
+
+    def _poll(self, task_id):
+        for finished_id, worker_id, code in self.coordinator.results():
+            outputs, assigned_id = self._tasks[finished_id]
+            self._assigned[assigned_id] -= 1
+            if code == 0:
+                for step in outputs:
+                    self.locations[step._output_dirname] = worker_id
+            self._exit_codes[finished_id] = code
+
+        for worker_id in self.coordinator.dead_workers(self.heartbeat_timeout):
+            self.coordinator.remove_worker(worker_id)
+            for lost_id, (outputs, assigned_id) in self._tasks.items():
+                if assigned_id == worker_id and lost_id not in self._exit_codes:
+                    self._assigned[worker_id] -= 1
+                    self._exit_codes[lost_id] = -1
+        return self._exit_codes.get(task_id)
+
+
+class local_cluster(object):
+    """
+    A coordinator with workers in local processes, e.g. for testing:
+        with local_cluster(4) as coordinator:
+            Scheduler(launcher=DistributedLauncher(coordinator)).run(workflow)
+    """
+    def __init__(self, n_workers, slots=1):
+        self.n_workers = n_workers
+        self.slots = slots
+
+    def __enter__(self):
+        # a new secret since the workers are forked from this process
+        authkey = binascii.hexlify(os.urandom(16))
+        self.coordinator = Coordinator(address=('localhost', 0), authkey=authkey)
+        self.processes = []
+        for i in range(self.n_workers):
+            worker = Worker(self.coordinator.address, authkey=authkey, slots=self.slots,
+                            worker_id='worker%s' % i)
+            # not a daemon since workers start a process per task
+            p = multiprocessing.Process(target=worker.run)
+            p.start()
+            self.processes.append(p)
+
+        self.coordinator.wait_for_workers(self.n_workers)
+        return self.coordinator
+
+    def __exit__(self, *exc):
+        self.coordinator.close()
+        for p in self.processes:
+            p.join(timeout=10)
+            if p.is_alive():
+                p.terminate()
@@ -2,8 +2,11 @@ import itertools
 import os
 import inspect
 
+import joblib
 from six import StringIO
 
+from . import stamps
+
 
 def get_inputs_helper(step, ignore, target):
     """
@@ -49,6 +52,111 @@ def get_drake_data(steps):
     return output_inputs
 
 
+_SOURCE_FILES = {}
+
+
+def _source_file(cls):
+    if cls not in _SOURCE_FILES:
+        _SOURCE_FILES[cls] = os.path.abspath(inspect.getsourcefile(cls))
+    return _SOURCE_FILES[cls]
+
+
+def get_source_classes(step):
+    """
+    Returns: the set of classes of the step and its non-target inputs,
+        excluding those in the drain library
+    """
+    objects = get_inputs(step, target=False)
+    objects.add(step)
+    return set(o.__class__ for o in objects
+               if not _source_file(o.__class__).startswith(os.path.dirname(__file__)))
+
+
+def get_sources(step):
+    """
+    Returns: the set of source files of the classes of the step and its
+        non-target inputs, excluding those in the drain library
+    """
+    return set(_source_file(cls) for cls in get_source_classes(step))
+
+
+def get_dependencies(step, write=True):
+    """
+    Args:
+        write: whether to write changed stamps, see stamps.files()
+    Returns: a pair of lists of the dependency files and source files of the
+        step which drake compares to its target. With content hashing these
+        are stamps of their contents, see drain.stamps.
+    """
+    if stamps.ENABLED:
+        return (stamps.files(step.dependencies, write),
+                stamps.classes(get_source_classes(step), write))
+    else:
+        return list(step.dependencies), sorted(get_sources(step))
+
+
+def status(data, n_jobs=16):
+    """
+    Determine which steps drake would run and why, without running it or
+    writing stamps, so that it does not change what the next execution sees.
+    As in drake, a step runs if it is not a target, if its target is missing
+    or older than its step.yaml, an input's target, a dependency or a source
+    file, or if an input runs.
+    Args:
+        data: a dict of step: target inputs, see get_drake_data()
+        n_jobs: number of threads used to stat the files
+    Returns: a dict of step: list of reasons it would run, empty if it is up to date
+    """
+    dependencies = {step: get_dependencies(step, write=False) for step in data}
+    filenames = set()
+    for step in data:
+        filenames.add(step._target_filename)
+        filenames.add(step._yaml_filename)
+        for files in dependencies[step]:
+            filenames.update(files)
+
+    filenames = list(filenames)
+    mtimes = dict(zip(filenames, joblib.Parallel(n_jobs=n_jobs, backend='threading')(
+            joblib.delayed(stamps.mtime)(f) for f in filenames)))
+
+    reasons = {}
+
+    def visit(step):
+        if step in reasons:
+            return reasons[step]
+
+        r = []
+        inputs = sorted(data[step], key=lambda i: i._output_dirname)
+        stale_inputs = [i for i in inputs if len(visit(i)) > 0]
+        target = mtimes[step._target_filename] if step.target else None
+        if not step.target:
+            r.append('not a target')
+        elif target is None:
+            r.append('missing target')
+        r.extend('stale input %s' % i._output_dirname for i in stale_inputs)
+
+        if target is not None:
+            # a missing step.yaml is written before running
+            if mtimes[step._yaml_filename] is None or mtimes[step._yaml_filename] > target:
+                r.append('changed step.yaml')
+            for i in inputs:
+                if i not in stale_inputs and mtimes[i._target_filename] > target:
+                    r.append('newer input %s' % i._output_dirname)
+            for kind, files in zip(('dependency', 'source'), dependencies[step]):
+                for f in files:
+                    if mtimes[f] is None:
+                        r.append('missing %s %s' % (kind, f))
+                    elif mtimes[f] > target:
+                        r.append('changed %s %s' % (kind, f))
+
+        reasons[step] = r
+        return r
+
+    for step in data:
+        visit(step)
+    return reasons
+
+
 def to_drake_step(inputs, output):
     """
     Args:
@@ -59,14 +167,12 @@ def to_drake_step(inputs, output):
     """
     i = [output._yaml_filename]
     i.extend(map(lambda i: i._target_filename, list(inputs)))
-    i.extend(output.dependencies)
 
-    # add source file of output and its non-target inputs
+    # add dependencies and source files of output and its non-target inputs
     # if they're not in the drain library
-    objects = get_inputs(output, target=False)
-    objects.add(output)
-    sources = set([os.path.abspath(inspect.getsourcefile(o.__class__)) for o in objects])
-    i.extend([s for s in sources if not s.startswith(os.path.dirname(__file__))])
+    dependencies, sources = get_dependencies(output)
+    i.extend(dependencies)
+    i.extend(sources)
 
     output_str = '%' + output.__class__.__name__
     if output.name:
@@ -111,10 +217,49 @@ def to_drakefile(steps, preview=True, debug=False, input_drakefile=None, bindir=
             output.setup_dump()
 
         drakefile.write(to_drake_step(inputs, output))
+    stamps.save()
 
     return drakefile.getvalue()
 
 
+def run_step(args, keep_previous=False):
+    """
+    Load and execute a step, as in bin/run_step.py which is run by drake
+    Args:
+        args: the target filenames of the output steps, if any, followed by the
+            step.yaml filename of the step to execute and the step.yaml or
+            target filenames of the inputs to load. Other arguments, e.g.
+            source files and dependencies, are ignored. There are several
+            outputs when the native scheduler fuses a chain of targets.
+        keep_previous: see Step.execute()
+    Returns: the executed step
+    """
+    import drain
+    from drain import serialize
+
+    if len(args) == 0:
+        raise ValueError('Need at least one argument')
+
+    drain.PATH = os.path.dirname(os.path.dirname(os.path.dirname(args[0])))
+
+    outputs = []
+    while len(args) > 0 and is_target_filename(args[0]):
+        outputs.append(serialize.load(args[0]))
+        args = args[1:]
+
+    if len(args) == 0 or not is_step_filename(args[0]):
+        raise ValueError('Need a step to run')
+
+    step = serialize.load(args[0])
+    inputs = []
+    for i in args[1:]:
+        if is_step_filename(i) or is_target_filename(i):
+            inputs.append(serialize.load(i))
+
+    step.execute(output=outputs, inputs=inputs, keep_previous=keep_previous)
+    return step
+
+
 def is_target_filename(filename):
     return filename.endswith('/target')
 
@@ -2,7 +2,7 @@ from tempfile import NamedTemporaryFile
 from pprint import pformat
 from itertools import product
 
-from sklearn import tree
+import numpy as np
 import pandas as pd
 from collections import Counter
 from six import StringIO
@@ -10,8 +10,15 @@ from six import StringIO
 from drain import util, step
 
 
-def explore(steps, reload=False):
-    return StepFrame(index=step.load(steps, reload=reload))
+def explore(steps, reload=False, n_jobs=1):
+    """
+    Load the given steps into a StepFrame, skipping those that fail to load
+    Args:
+        steps: collection of steps or a function returning one
+        reload: whether to clear the cache of loaded steps first
+        n_jobs: number of threads used to load steps, see step.load()
+    """
+    return StepFrame(index=step.load(steps, reload=reload, n_jobs=n_jobs))
 
 
 def expand(self, prefix=False, index=True, diff=True, existence=True):
@@ -25,6 +32,9 @@ def expand(self, prefix=False, index=True, diff=True, existence=True):
     argument values are converted to string representations (using pprint)
     when index=True.
 
+    The collected kwargs are cached on the StepFrame or StepSeries until its
+    index changes, so repeated calls (e.g. printing) are cheap.
+
     If "inputs" is an argument those steps' kwargs are also expanded (and
     their inputs recursively). If there are multiple steps with the same
     argument names they are prefixed by their names or if those are not set
@@ -51,8 +61,46 @@ def expand(self, prefix=False, index=True, diff=True, existence=True):
 
     Returns: a DatFrame with the arguments of the steps expanded.
     """
+    # the parameter table is cached until the index changes
+    if self._expand_cache is None or self._expand_cache[0] is not self.index:
+        self._expand_cache = (self.index, {})
+    tables = self._expand_cache[1]
+
+    key = (prefix, diff, existence)
+    if key not in tables:
+        tables[key] = _expand_kwargs(self.index, prefix=prefix, diff=diff,
+                                     existence=existence)
+    expanded = tables[key].copy()
+
+    if index:
+        columns = list(expanded.columns)
+        try:
+            if len(columns) > 0:
+                expanded.set_index(columns, inplace=True)
+            else:
+                expanded.index = [None]*len(expanded)
+        except TypeError:
+            _print_unhashable(expanded, columns)
+            expanded.set_index(columns, inplace=True)
+
+        df = self.__class__.__bases__[0](self, copy=True)
+        df.index = expanded.index
+
+    else:
+        df = pd.concat((expanded, self), axis=1)
+        # When index=False, the index is still a Step collection
+        df = StepFrame(expanded)
+
+    return df
+
+
+def _expand_kwargs(steps, prefix=False, diff=True, existence=True):
+    """
+    Helper for expand() which collects and diffs the kwargs of the steps.
+    Returns: a DataFrame of the expanded kwargs indexed by steps
+    """
     # collect kwargs resulting in a list of {name: kwargs} dicts
-    dicts = [step._collect_kwargs(s, drop_duplicate_names=True) for s in self.index]
+    dicts = [step._collect_kwargs(s, drop_duplicate_names=True) for s in steps]
     # if any of the kwargs are themselves dicts, expand them
     dicts = [{k: util.dict_expand(v) for k, v in s.items()} for s in dicts]
 
@@ -70,14 +118,14 @@ def expand(self, prefix=False, index=True, diff=True, existence=True):
 
             if sum(map(len, ndiffs)) == 0:  # if they're all the same
                 # but not all had the key and existence=True
-                if existence and len(ndicts) < len(self):
+                if existence and len(ndicts) < len(steps):
                     for m, d in zip(diff_dicts, dicts):
                         m[name] = {tuple(): name in d.keys()}
             else:  # if there was a diff
                 diff_iter = iter(ndiffs)
                 for m, d in zip(diff_dicts, dicts):
                     if name in d.keys() or not existence:
-                        m[name] = diff_iter.next()  # get the corresponding diff
+                        m[name] = next(diff_iter)  # get the corresponding diff
 
         dicts = diff_dicts
 
@@ -98,31 +146,11 @@ def expand(self, prefix=False, index=True, diff=True, existence=True):
     merged_dicts = [{str.join('_', map(str, k if k[1:] in prefix_keys else k[1:])): v
                     for k, v in d.items()} for d in merged_dicts]
 
-    expanded = pd.DataFrame(merged_dicts, index=self.index)
-
-    if index:
-        columns = list(expanded.columns)
-        try:
-            if len(columns) > 0:
-                expanded.set_index(columns, inplace=True)
-            else:
-                expanded.index = [None]*len(expanded)
-        except TypeError:
-            _print_unhashable(expanded, columns)
-            expanded.set_index(columns, inplace=True)
-
-        df = self.__class__.__bases__[0](self, copy=True)
-        df.index = expanded.index
-
-    else:
-        df = pd.concat((expanded, self), axis=1)
-        # When index=False, the index is still a Step collection
-        df = StepFrame(expanded)
+    return pd.DataFrame(merged_dicts, index=steps)
 
-    return df
 
-
-def dapply(self, fn, pairwise=False, symmetric=True, diagonal=False, block=None, **kwargs):
+def dapply(self, fn, pairwise=False, symmetric=True, diagonal=False, block=None,
+           executor=None, **kwargs):
     """
     Apply function to each step object in the index
 
@@ -130,6 +158,10 @@ def dapply(self, fn, pairwise=False, symmetric=True, diagonal=False, block=None,
         fn: function to apply. If a list then each function is applied
         pairwise: whether to apply the function to pairs of steps
         symmetric, diagonal, block: passed to apply_pairwise when pairwise=True
+        executor: an optional concurrent.futures.Executor. When specified the
+            whole grid of steps, functions and kwargs is submitted to it
+            before any results are collected. A process executor requires
+            the functions and steps to be picklable.
         kwargs: a keyword arguments to pass to each function. Arguments
             with list value are grid searched using util.dict_product.
 
@@ -139,14 +171,25 @@ def dapply(self, fn, pairwise=False, symmetric=True, diagonal=False, block=None,
     functions = util.make_list(fn)
     search = list(product(functions, util.dict_product(kwargs)))
 
+    if pairwise:
+        pairs = _pairs(self, symmetric=symmetric, diagonal=diagonal, block=block)
+        tasks = [(fn, (self.index[i], self.index[j]), kw)
+                 for fn, kw in search for i, j in pairs]
+    else:
+        tasks = [(fn, (s,), kw) for fn, kw in search for s in self.index]
+    values = iter(_evaluate(tasks, executor))
+
     results = []
     for fn, kw in search:
         if not pairwise:
-            r = self.index.to_series().apply(lambda step: fn(step, **kw))
+            r = [next(values) for s in self.index]
+            if len(r) > 0 and all(isinstance(v, pd.Series) for v in r):
+                r = pd.DataFrame(r)
+                r.index = self.index
+            else:
+                r = pd.Series(r, index=self.index)
         else:
-            r = apply_pairwise(self, fn,
-                               symmetric=symmetric, diagonal=diagonal, block=block,
-                               **kw)
+            r = _pairwise_frame(self.index, pairs, [next(values) for p in pairs])
 
         name = [] if len(functions) == 1 else [fn.__name__]
         name += util.dict_subset(kw, search_keys).values()
@@ -177,7 +220,8 @@ def dapply(self, fn, pairwise=False, symmetric=True, diagonal=False, block=None,
             return StepSeries(result)
 
 
-def apply_pairwise(self, function, symmetric=True, diagonal=False, block=None, **kwargs):
+def apply_pairwise(self, function, symmetric=True, diagonal=False, block=None,
+                   executor=None, **kwargs):
     """
     Helper function for pairwise apply.
     Args:
@@ -186,26 +230,63 @@ def apply_pairwise(self, function, symmetric=True, diagonal=False, block=None, *
         symmetric: whether function is symmetric in the two steps
         diagonal: whether to apply on the diagonal
         block: apply only when the given columns match
+        executor: optional concurrent.futures.Executor to apply with
         kwargs: keyword arguments to pass to the function
 
     Returns:
         DataFrame with index and columns equal to the steps argument
     """
     steps = self.index
-    r = pd.DataFrame(index=steps, columns=steps)
+    pairs = _pairs(self, symmetric=symmetric, diagonal=diagonal, block=block)
+    values = _evaluate([(function, (steps[i], steps[j]), kwargs) for i, j in pairs],
+                       executor)
+    return _pairwise_frame(steps, pairs, values)
+
+
+def _pairs(self, symmetric=True, diagonal=False, block=None):
+    """
+    Returns: a list of (i, j) positions of the pairs of steps to apply to
+    """
+    steps = self.index
+    if block is not None:
+        df = self.reset_index()
+        df = df.merge(df, on=block)
+        blocked = set(zip(df.index_x, df.index_y))
+
+    pairs = []
     for i, s1 in enumerate(steps):
-        j = range(i+1 if symmetric else len(steps))
-        if not diagonal:
-            j.remove(i)
-        other = set(steps[j])
-        if block is not None:
-            df = self.reset_index()
-            df = df.merge(df, on=block)
-            other &= set(df[df.index_x == s1].index_y)
+        for j in range(i+1 if symmetric else len(steps)):
+            if (i == j and not diagonal) or \
+                    (block is not None and (s1, steps[j]) not in blocked):
+                continue
+            pairs.append((i, j))
+
+    return pairs
+
+
+def _pairwise_frame(steps, pairs, values):
+    """
+    Assemble pairwise values into a DataFrame indexed by steps in both dimensions.
+    Pairs which were not applied are NaN.
+    """
+    r = np.empty((len(steps), len(steps)), dtype=object)
+    r[:] = np.nan
+    for (i, j), v in zip(pairs, values):
+        r[i, j] = v
+
+    return pd.DataFrame(r, index=steps, columns=steps)
 
-        for s2 in other:
-            r.ix[s1, s2] = function(s1, s2, **kwargs)
-    return r
+
+def _evaluate(tasks, executor=None):
+    """
+    Evaluate (function, args, kwargs) tasks, concurrently when an executor is given.
+    Returns: a list of return values in the order of tasks
+    """
+    if executor is None:
+        return [fn(*args, **kwargs) for fn, args, kwargs in tasks]
+
+    futures = [executor.submit(fn, *args, **kwargs) for fn, args, kwargs in tasks]
+    return [f.result() for f in futures]
 
 
 def _assert_step_collection(steps):
@@ -220,6 +301,11 @@ class StepFrame(pd.DataFrame):
     expand = expand
     dapply = dapply
 
+    # not propagated to derived frames, see expand()
+    _internal_names = pd.DataFrame._internal_names + ['_expand_cache']
+    _internal_names_set = set(_internal_names)
+    _expand_cache = None
+
     def __init__(self, *args, **kwargs):
         pd.DataFrame.__init__(self, *args, **kwargs)
         _assert_step_collection(self.index.values)
@@ -247,6 +333,10 @@ class StepSeries(pd.Series):
     expand = expand
     dapply = dapply
 
+    _internal_names = pd.Series._internal_names + ['_expand_cache']
+    _internal_names_set = set(_internal_names)
+    _expand_cache = None
+
     def __init__(self, *args, **kwargs):
         pd.Series.__init__(self, *args, **kwargs)
         _assert_step_collection(self.index.values)
@@ -297,6 +387,7 @@ def show_tree(tree, feature_names, max_depth=None):
 
 def export_tree(clf, filename, feature_names=None, max_depth=None):
     import pydot
+    from sklearn import tree
 
     dot_data = StringIO()
     tree.export_graphviz(clf, out_file=dot_data,
@@ -1,6 +1,7 @@
+import warnings
+
 import numpy as np
 import pandas as pd
-import sklearn.metrics
 
 from drain.util import to_float
 
@@ -18,6 +19,11 @@ def _argsort(y_score, k=None):
     Returns the indexes in descending order of the top k score
         or all scores if k is None
     """
+    if k is not None and k < len(y_score):
+        # only sort the selected top k
+        top = _argtop(y_score, k)
+        return top[y_score[top].argsort()[::-1]]
+
     ranks = y_score.argsort()
     argsort = ranks[::-1]
     if k is not None:
@@ -31,10 +37,13 @@ def _argtop(y_score, k=None):
     Returns the indexes of the top k scores (not necessarily sorted)
     """
     # avoid sorting when just want the top all
-    if k is None:
+    if k is None or k >= len(y_score):
         return slice(0, len(y_score))
+    elif k <= 0:
+        return np.array([], dtype=int)
     else:
-        return _argsort(y_score, k)
+        # linear time selection of the top k
+        return np.argpartition(y_score, len(y_score) - k)[len(y_score) - k:]
 
 
 def count(y_true, y_score=None, countna=False):
@@ -78,6 +87,8 @@ def roc_auc(y_true, y_score):
     """
     Returns are under the ROC curve
     """
+    import sklearn.metrics
+
     notnull = ~np.isnan(y_true)
     fpr, tpr, thresholds = sklearn.metrics.roc_curve(y_true[notnull], y_score[notnull])
     return sklearn.metrics.auc(fpr, tpr)
@@ -152,3 +163,243 @@ def recall_series(y_true, y_score, k=None, value=True):
 
     a = np.nan_to_num(y_true[top]).cumsum()
     return pd.Series(a, index=np.arange(1, len(a)+1))
+
+
+class RankedScores(object):
+    """
+    Sorts a score vector once and answers top k metrics from prefix sums.
+    Useful when the same predictions are evaluated at many values of k or p.
+    Every method agrees with the corresponding function above applied to
+    the top k examples.
+    """
+    def __init__(self, y_true, y_score):
+        y_true, y_score = to_float(y_true, y_score)
+        self.order = _argsort(y_score)
+        y_true = y_true[self.order]
+
+        # i-th entry is the number of labels (positives) in the top i
+        self._labels = np.concatenate(([0], (~np.isnan(y_true)).cumsum()))
+        self._positives = np.concatenate(([0], np.nan_to_num(y_true).cumsum(dtype=np.float64)))
+
+    def __len__(self):
+        return len(self.order)
+
+    def get_k(self, k=None, p=None, p_of='notnull'):
+        """
+        Returns the number of top examples for the given k or proportion p,
+            as in model.y_subset(), or None for all examples
+        """
+        if k is not None and p is not None:
+            raise ValueError("Cannot specify both k and p")
+        elif p is not None:
+            if p_of == 'notnull':
+                k = int(p*self._labels[-1])
+            elif p_of == 'true':
+                k = int(p*self._positives[-1])
+            elif p_of == 'all':
+                k = int(p*len(self))
+            else:
+                raise ValueError('Invalid value for p_of: %s' % p_of)
+
+        return k
+
+    def _k(self, k):
+        return len(self) if k is None else min(k, len(self))
+
+    def count(self, k=None, countna=False):
+        k = self._k(k)
+        return self._labels[k] if not countna else k
+
+    def baseline(self, k=None):
+        k = self._k(k)
+        if k > 0:
+            return self._positives[k]/self._labels[k]
+        else:
+            return 0.0
+
+    def precision(self, k=None, return_bounds=False):
+        k = self._k(k)
+        n = self._positives[k]
+        d = self._labels[k]
+        p = n/d
+
+        if return_bounds:
+            bounds = (n/k, (n+k-d)/k) if k != 0 else (np.nan, np.nan)
+            return p, d, bounds[0], bounds[1]
+        else:
+            return p
+
+    def recall(self, k=None, value=True):
+        k = self._k(k)
+        return self._positives[k] if value else self._labels[k] - self._positives[k]
+
+    def lift(self, k=None):
+        return self.precision(k)/self.baseline()
+
+
+class Accumulator(object):
+    """
+    Base class for metrics which consume predictions in chunks via update().
+    Partial accumulators, e.g. from different workers or partitions, are
+    combined with merge() and the metric is returned by value().
+    The base class keeps the number of examples, labels and positives.
+    """
+    def __init__(self):
+        self.n = 0
+        self.labels = 0
+        self.positives = 0.0
+
+    def update(self, y_true, y_score):
+        y_true, y_score = to_float(y_true, y_score)
+        self.n += len(y_true)
+        self.labels += (~np.isnan(y_true)).sum()
+        self.positives += np.nan_to_num(y_true).sum(dtype=np.float64)
+        self._update(y_true, y_score)
+        return self
+
+    def merge(self, other):
+        if type(other) is not type(self):
+            raise ValueError('Cannot merge %s into %s' %
+                             (type(other).__name__, type(self).__name__))
+        self.n += other.n
+        self.labels += other.labels
+        self.positives += other.positives
+        self._merge(other)
+        return self
+
+    def _update(self, y_true, y_score):
+        pass
+
+    def _merge(self, other):
+        pass
+
+    def value(self):
+        raise NotImplementedError
+
+
+class CountAccumulator(Accumulator):
+    def __init__(self, countna=False):
+        Accumulator.__init__(self)
+        self.countna = countna
+
+    def value(self):
+        return self.n if self.countna else self.labels
+
+
+class BaselineAccumulator(Accumulator):
+    def value(self):
+        return self.positives/self.labels if self.n > 0 else 0.0
+
+
+class TopKAccumulator(Accumulator):
+    """
+    Keeps the labels and scores of the top k examples seen so far,
+    so memory is bounded by k regardless of the number of chunks.
+    When k is None only the totals are kept.
+    """
+    def __init__(self, k=None):
+        Accumulator.__init__(self)
+        self.k = k
+        self.y_true = np.empty(0, dtype=np.float32)
+        self.y_score = np.empty(0, dtype=np.float32)
+
+    def _update(self, y_true, y_score):
+        if self.k is None:
+            return
+
+        y_true = np.concatenate((self.y_true, y_true))
+        y_score = np.concatenate((self.y_score, y_score))
+        top = _argtop(y_score, self.k)
+        self.y_true, self.y_score = y_true[top], y_score[top]
+
+    def _merge(self, other):
+        if other.k != self.k:
+            raise ValueError('Cannot merge top %s into top %s' % (other.k, self.k))
+        self._update(other.y_true, other.y_score)
+
+
+class PrecisionAccumulator(TopKAccumulator):
+    def __init__(self, k=None, return_bounds=False):
+        TopKAccumulator.__init__(self, k=k)
+        self.return_bounds = return_bounds
+
+    def value(self):
+        if self.k is not None:
+            return precision(self.y_true, self.y_score, k=self.k,
+                             return_bounds=self.return_bounds)
+
+        n, d, k = np.float32(self.positives), self.labels, self.n
+        p = n/d
+        if self.return_bounds:
+            bounds = (n/k, (n+k-d)/k) if k != 0 else (np.nan, np.nan)
+            return p, d, bounds[0], bounds[1]
+        else:
+            return p
+
+
+class RecallAccumulator(TopKAccumulator):
+    def __init__(self, k=None, value=True):
+        TopKAccumulator.__init__(self, k=k)
+        self.positive = value
+
+    def value(self):
+        if self.k is not None:
+            return recall(self.y_true, self.y_score, k=self.k, value=self.positive)
+        else:
+            return self.positives if self.positive else self.labels - self.positives
+
+
+class RocAucAccumulator(Accumulator):
+    """
+    Approximates the area under the ROC curve from histograms of the scores
+    of positive and negative examples. Scores outside of range are clipped,
+    which ties them, so a warning is issued. Pass the range of the scores,
+    e.g. of a decision_function. Accumulators must use the same bins and
+    range to be merged.
+    """
+    def __init__(self, bins=1000, range=(0, 1)):
+        Accumulator.__init__(self)
+        self.edges = np.linspace(range[0], range[1], bins + 1)
+        self.true_counts = np.zeros(bins)
+        self.false_counts = np.zeros(bins)
+
+    def _update(self, y_true, y_score):
+        if (y_score < self.edges[0]).any() or (y_score > self.edges[-1]).any():
+            warnings.warn('Scores outside of range (%s, %s) are clipped and tied, so the '
+                          'AUC may be wrong' % (self.edges[0], self.edges[-1]))
+        y_score = np.clip(y_score, self.edges[0], self.edges[-1])
+        self.true_counts += np.histogram(y_score[y_true == 1], self.edges)[0]
+        self.false_counts += np.histogram(y_score[y_true == 0], self.edges)[0]
+
+    def _merge(self, other):
+        if not np.array_equal(other.edges, self.edges):
+            raise ValueError('Cannot merge histograms with different bins')
+        self.true_counts += other.true_counts
+        self.false_counts += other.false_counts
+
+    def value(self):
+        # thresholds in descending order, examples within a bin are tied
+        tpr = np.concatenate(([0], self.true_counts[::-1].cumsum()))
+        fpr = np.concatenate(([0], self.false_counts[::-1].cumsum()))
+        tpr, fpr = tpr/tpr[-1], fpr/fpr[-1]
+        return ((fpr[1:] - fpr[:-1]) * (tpr[1:] + tpr[:-1])).sum()/2
+
+
+def accumulate(chunks, accumulators):
+    """
+    Update accumulators with each chunk
+    Args:
+        chunks: iterable of (y_true, y_score) pairs
+        accumulators: an Accumulator or a collection of Accumulators
+    Returns: the value of the accumulator or a list of values
+    """
+    single = isinstance(accumulators, Accumulator)
+    if single:
+        accumulators = [accumulators]
+
+    for y_true, y_score in chunks:
+        for a in accumulators:
+            a.update(y_true, y_score)
+
+    values = [a.value() for a in accumulators]
+    return values[0] if single else values
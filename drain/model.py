@@ -6,9 +6,9 @@ import inspect
 import pandas as pd
 import numpy as np
 
-from sklearn.externals import joblib
+import joblib
 
-from drain import util, metrics
+from drain import util, metrics, step
 from drain.step import Step, Call
 
 
@@ -55,7 +55,7 @@ class FitPredict(Step):
             y_train = y_train.astype(bool)
 
             logging.info('Fitting with %s examples, %s features' % X_train.shape)
-            if 'sample_weight' in inspect.getargspec(estimator.fit).args and\
+            if 'sample_weight' in util.get_argspec(estimator.fit).args and\
                     sample_weight is not None:
                 logging.info('Using sample weight')
                 sample_weight = sample_weight.loc[y_train.index]
@@ -100,12 +100,17 @@ class FitPredict(Step):
             joblib.dump(result['estimator'], filename)
         if self.return_feature_importances:
             filename = os.path.join(self._dump_dirname, 'feature_importances.hdf')
-            result['feature_importances'].to_hdf(filename, 'df')
+            step.write_hdf(filename, [('df', result['feature_importances'])], self._storage)
         if self.return_predictions:
             filename = os.path.join(self._dump_dirname, 'y.hdf')
-            result['y'].to_hdf(filename, 'df')
+            step.write_hdf(filename, [('df', result['y'])], self._storage)
 
-    def load(self):
+    def load(self, columns=None, where=None):
+        """
+        Args:
+            columns, where: read only these columns and rows of the predictions,
+                see step.read_hdf()
+        """
         result = {}
         if self.return_estimator:
             filename = os.path.join(self._dump_dirname, 'estimator.pkl')
@@ -115,7 +120,7 @@ class FitPredict(Step):
             result['feature_importances'] = pd.read_hdf(filename, 'df')
         if self.return_predictions:
             filename = os.path.join(self._dump_dirname, 'y.hdf')
-            result['y'] = pd.read_hdf(filename, 'df')
+            result['y'] = step.read_hdf(filename, 'df', columns=columns, where=where)
 
         self.result = result
 
@@ -215,7 +220,7 @@ def _proximity_parallel_helper(train_nodes, t, k):
 
 
 def _proximity_helper(train_nodes, test_nodes, k):
-    from sklearn.externals.joblib import Parallel, delayed
+    from joblib import Parallel, delayed
 
     results = Parallel(n_jobs=16, backend='threading')(
         delayed(_proximity_parallel_helper)(train_nodes, t, k) for t in test_nodes)
@@ -293,7 +298,7 @@ def y_subset(y, query=None, aux=None, subset=None, dropna=False, outcome='true',
 
 
 # list of arguments to y_subset() for Metric above
-Y_SUBSET_ARGS = inspect.getargspec(y_subset).args
+Y_SUBSET_ARGS = util.get_argspec(y_subset).args
 
 
 def true_score(y, outcome='true', score='score', **subset_args):
@@ -301,22 +306,85 @@ def true_score(y, outcome='true', score='score', **subset_args):
     return util.to_float(y[outcome], y[score])
 
 
+def ranked_scores(predict_step, query=None, dropna=False, outcome='true',
+                  score='score', ascending=False):
+    """
+    Returns a metrics.RankedScores of the step's predictions, subset by query
+    and dropna as in y_subset(). It is cached on the step so that evaluating
+    many values of k or p sorts the predictions only once.
+    """
+    y = predict_step.result['y']
+    key = (query, dropna, outcome, score, ascending)
+    cache = predict_step.__dict__.setdefault('_ranked_scores', {})
+    # the cache is invalid when the step's result has been replaced
+    if key in cache and cache[key][0] is y:
+        return cache[key][1]
+
+    y_true, y_score = true_score(y, query=query, dropna=dropna,
+                                 outcome=outcome, score=score)
+    if ascending:
+        y_score = -y_score
+    ranked = metrics.RankedScores(y_true, y_score)
+    cache[key] = (y, ranked)
+
+    return ranked
+
+
+# metrics answered by ranked_scores() instead of subsetting and sorting y
+RANKED_METRICS = ('count', 'baseline', 'precision', 'recall')
+
+
+def y_chunks(predict_step, chunksize=1000000, outcome='true', score='score'):
+    """
+    Iterate over the step's dumped predictions without loading them all,
+        e.g. to pass to metrics.accumulate()
+    Note that chunked reads require y.hdf to be written in table format,
+        i.e. with a storage policy of format='table', see step.hdf_args().
+    Returns: a generator of (y_true, y_score) pairs
+    """
+    filename = os.path.join(predict_step._dump_dirname, 'y.hdf')
+    store = pd.HDFStore(filename, mode='r')
+    try:
+        is_table = store.get_storer('df').is_table
+    finally:
+        store.close()
+    if not is_table:
+        raise ValueError("Cannot read %s in chunks, dump predictions with a storage "
+                         "policy of format='table'" % filename)
+
+    for y in pd.read_hdf(filename, key='df', columns=[outcome, score], chunksize=chunksize):
+        yield y[outcome].values, y[score].values
+
+
 def make_metric(function):
     def metric(predict_step, **kwargs):
-        y = predict_step.result['y']
         subset_args = [k for k in Y_SUBSET_ARGS if k in kwargs]
         kwargs_subset = {k: kwargs[k] for k in subset_args}
-        y_true, y_score = true_score(y, **kwargs_subset)
-
         kwargs_metric = {k: kwargs[k] for k in kwargs if k not in Y_SUBSET_ARGS}
+
+        if function.__name__ in RANKED_METRICS and \
+                kwargs_subset.get('aux') is None and kwargs_subset.get('subset') is None:
+            k_args = {k: kwargs_subset.pop(k) for k in ('k', 'p', 'p_of')
+                      if k in kwargs_subset}
+            ranked = ranked_scores(predict_step, **util.dict_subset(
+                    kwargs_subset, ('query', 'dropna', 'outcome', 'score', 'ascending')))
+            k = ranked.get_k(**k_args)
+            return getattr(ranked, function.__name__)(k=k, **kwargs_metric)
+
+        y = predict_step.result['y']
+        y_true, y_score = true_score(y, **kwargs_subset)
         r = function(y_true, y_score, **kwargs_metric)
         return r
 
     return metric
 
 
+# functions of metrics.py which are helpers rather than metrics of y_true and y_score
+NOT_METRICS = ('accumulate',)
+
 metric_functions = [o for o in inspect.getmembers(metrics)
-                    if inspect.isfunction(o[1]) and not o[0].startswith('_')]
+                    if inspect.isfunction(o[1]) and not o[0].startswith('_') and
+                    o[0] not in NOT_METRICS]
 
 for name, function in metric_functions:
     function = make_metric(function)
@@ -385,6 +453,58 @@ def similarity(self, other, **kwargs):
         len(y0.index | y1.index)
 
 
+def _intersection_counts(steps, **kwargs):
+    """
+    Computes each step's y_subset() once and encodes its index as a row of a
+    sparse membership matrix over the union of all entities. The product of
+    that matrix with its transpose counts every pairwise intersection.
+    Returns: a tuple of the matrix of intersection counts and the subset sizes
+    """
+    from scipy import sparse
+
+    indexes = [y_subset(s.result['y'], **kwargs).index for s in steps]
+    sizes = [len(i) for i in indexes]
+    entities = np.concatenate([np.asarray(i.values, dtype=object) for i in indexes]) \
+        if len(indexes) > 0 else np.array([])
+    codes, uniques = pd.factorize(entities)
+    rows = np.repeat(np.arange(len(indexes)), sizes)
+
+    members = sparse.csr_matrix((np.ones(len(codes)), (rows, codes)),
+                                shape=(len(indexes), len(uniques)))
+    members.data[:] = 1  # ignore duplicate entities
+    counts = members.dot(members.T).toarray().astype(int)
+
+    return counts, counts.diagonal()
+
+
+def overlap_matrix(steps, **kwargs):
+    """
+    Computes overlap() for every pair of the given steps at once
+    Args:
+        steps: collection of predict steps, e.g. the index of a StepFrame
+        kwargs: passed to y_subset()
+    Returns: DataFrame with index and columns equal to steps
+    """
+    counts, sizes = _intersection_counts(steps, **kwargs)
+    return pd.DataFrame(counts, index=steps, columns=steps)
+
+
+def similarity_matrix(steps, **kwargs):
+    """
+    Computes similarity() (Jaccard index) for every pair of the given steps at once
+    Args:
+        steps: collection of predict steps, e.g. the index of a StepFrame
+        kwargs: passed to y_subset()
+    Returns: DataFrame with index and columns equal to steps
+    """
+    counts, sizes = _intersection_counts(steps, **kwargs)
+    unions = sizes[:, np.newaxis] + sizes[np.newaxis, :] - counts
+    with np.errstate(divide='ignore', invalid='ignore'):
+        similarity = counts.astype(np.float32) / unions.astype(np.float32)
+
+    return pd.DataFrame(similarity, index=steps, columns=steps)
+
+
 def rank(self, **kwargs):
     y0 = self.result['y']
     y0 = y_subset(y0, **kwargs)
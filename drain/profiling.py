@@ -0,0 +1,254 @@
+"""
+Measurement of the resources used by each phase (load, run, dump) of a step's
+execution. Step.execute() measures the phases of every step it executes and
+writes the totals for the output step to profile.yaml next to step.yaml.
+Used by the 'drain profile' command and to learn resource hints.
+"""
+import logging
+import math
+import os
+import socket
+import sys
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+import yaml
+
+from . import util, drake
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+FILENAME = 'profile.yaml'
+PHASES = ('load', 'run', 'dump')
+
+
+def peak_rss():
+    """
+    Returns: the peak resident set size of this process in bytes, or None if unknown
+    """
+    if resource is None:
+        return None
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes except on macOS
+    return maxrss if sys.platform == 'darwin' else maxrss * 1024
+
+
+def io_counters():
+    """
+    Returns: a dict of the bytes read and written by this process using system
+        calls, including those served by the page cache, or an empty dict if
+        unknown. Only available on Linux.
+    """
+    try:
+        with open('/proc/self/io') as f:
+            counters = dict(line.split(': ') for line in f.read().splitlines())
+    except (IOError, OSError, ValueError):
+        return {}
+    return {'read_bytes': int(counters['rchar']), 'write_bytes': int(counters['wchar'])}
+
+
+def _snapshot():
+    t = os.times()
+    # include children, e.g. joblib and subprocess workers which have exited
+    return time.time(), t[0] + t[1] + t[2] + t[3], io_counters()
+
+
+@contextmanager
+def measure(step, phase):
+    """
+    Measure a phase of a step's execution and store it in step._profile.
+    peak_rss is the peak of the process at the end of the phase, not of the phase alone.
+    Args:
+        step: the step
+        phase: the name of the phase, one of PHASES
+    """
+    wall, cpu, io = _snapshot()
+    yield
+    end_wall, end_cpu, end_io = _snapshot()
+
+    stats = {'wall': end_wall - wall, 'cpu': end_cpu - cpu, 'peak_rss': peak_rss()}
+    for k in end_io:
+        stats[k] = end_io[k] - io[k]
+    step.__dict__.setdefault('_profile', {})[phase] = stats
+
+
+def summarize(step):
+    """
+    Total the measured phases of a step and the inputs executed with it,
+    excluding inputs which were dumped, and so profiled, themselves
+    Returns: a dict of phase: stats
+    """
+    steps = []
+    visited = set()
+
+    def visit(s):
+        visited.add(s)
+        steps.append(s)
+        for i in s.inputs:
+            if i not in visited and 'dump' not in i.__dict__.get('_profile', {}):
+                visit(i)
+    visit(step)
+
+    phases = {}
+    for s in steps:
+        for phase, stats in s.__dict__.get('_profile', {}).items():
+            if phase not in phases:
+                phases[phase] = dict(stats)
+                continue
+            total = phases[phase]
+            for k, v in stats.items():
+                if v is None or total.get(k) is None:
+                    total[k] = None
+                elif k == 'peak_rss':
+                    total[k] = max(total[k], v)
+                else:
+                    total[k] += v
+    return phases
+
+
+def write(step):
+    """
+    Write the profile of an executed and dumped step to its output directory.
+    Failures are logged, not raised, since the step is already committed.
+    Returns: the profile dict, or None if it could not be computed
+    """
+    from .step import result_nbytes
+
+    try:
+        profile = {
+            'digest': step._digest,
+            'class': step.__class__.__name__,
+            'host': socket.gethostname(),
+            'time': time.time(),
+            'phases': summarize(step),
+            'result_bytes': result_nbytes(step.result),
+            'dump_bytes': util.dir_size(step._dump_dirname),
+        }
+    except Exception as e:
+        logging.warning('Could not profile: %s' % e)
+        return None
+
+    try:
+        util.atomic_write(os.path.join(step._output_dirname, FILENAME),
+                          yaml.safe_dump(profile, default_flow_style=False))
+    except Exception as e:
+        logging.warning('Could not write profile: %s' % e)
+
+    return profile
+
+
+def read(step):
+    """
+    Returns: the profile of the step's last execution, or None if it was not profiled
+    """
+    filename = os.path.join(step._output_dirname, FILENAME)
+    if not os.path.isfile(filename):
+        return None
+    with open(filename) as f:
+        return yaml.safe_load(f)
+
+
+def duration(profile, phases=PHASES):
+    """
+    Returns: the total wall time of the given phases of a profile, or None if
+        the profile is None or has none of the phases
+    """
+    if profile is None:
+        return None
+    walls = [profile['phases'][p]['wall'] for p in phases if p in profile['phases']]
+    return sum(walls) if len(walls) > 0 else None
+
+
+def resources(profile):
+    """
+    Learn resource hints from a profile, see Step.get_resources()
+    Returns: a dict of cores, memory (peak RSS in bytes) and duration (seconds),
+        each None if the profile is None
+    """
+    if profile is None:
+        return {'cores': None, 'memory': None, 'duration': None}
+
+    phases = profile['phases'].values()
+    wall = sum(p['wall'] for p in phases)
+    cpu = sum(p['cpu'] for p in phases)
+    memory = [p['peak_rss'] for p in phases if p['peak_rss'] is not None]
+    return {'cores': max(1, int(math.ceil(cpu / wall))) if wall > 0 else 1,
+            'memory': max(memory) if len(memory) > 0 else None,
+            'duration': wall}
+
+
+def report(workflow):
+    """
+    Args:
+        workflow: collection of steps
+    Returns: a DataFrame of the profiles of the target steps in the workflow,
+        one row per step indexed by output directory, heaviest first
+    """
+    rows = {}
+    for step in drake.get_drake_data(workflow):
+        profile = read(step)
+        if profile is None:
+            continue
+        phases = profile['phases']
+        row = {'class': profile['class'],
+               'wall': duration(profile),
+               'cpu': sum(p['cpu'] for p in phases.values()),
+               'peak_rss': resources(profile)['memory'],
+               'result_bytes': profile['result_bytes'],
+               'dump_bytes': profile['dump_bytes']}
+        for p in PHASES:
+            row[p] = phases[p]['wall'] if p in phases else None
+        rows[step._output_dirname] = row
+
+    columns = ['class', 'wall', 'cpu'] + list(PHASES) + \
+        ['peak_rss', 'result_bytes', 'dump_bytes']
+    df = pd.DataFrame.from_dict(rows, orient='index').reindex(columns=columns)
+    return df.sort_values('wall', ascending=False)
+
+
+def critical_path(workflow, durations=None):
+    """
+    Find the chain of target steps with the longest total duration, which
+    bounds the time to execute the workflow with unlimited parallelism
+    Args:
+        workflow: collection of steps
+        durations: optional dict of step: duration in seconds, defaulting to
+            the duration of the step's profile or 0 if it was not profiled
+    Returns: a pair of the list of steps, first to last, and the total duration
+    """
+    data = drake.get_drake_data(workflow)
+    if durations is None:
+        durations = {s: duration(read(s)) or 0 for s in data}
+
+    # finish time of the longest chain ending at each step and its last input
+    finish = {}
+    previous = {}
+
+    def visit(s):
+        if s not in finish:
+            inputs = list(data[s])
+            for i in inputs:
+                visit(i)
+            last = max(inputs, key=lambda i: finish[i]) if len(inputs) > 0 else None
+            previous[s] = last
+            finish[s] = durations.get(s, 0) + (finish[last] if last is not None else 0)
+        return finish[s]
+
+    for s in data:
+        visit(s)
+    if len(finish) == 0:
+        return [], 0
+
+    s = max(finish, key=lambda s: finish[s])
+    total = finish[s]
+    path = []
+    while s is not None:
+        path.append(s)
+        s = previous[s]
+    path.reverse()
+    return path, total
@@ -0,0 +1,258 @@
+"""
+A native scheduler for the target steps of a workflow, an alternative to drake.
+Each step is launched, by default as a run_step.py subprocess, when its inputs
+are complete. Running steps are packed by their resource hints (see
+Step.get_resources()) so that their total cores and memory fit the machine,
+and ready steps are started in order of the longest chain of work that
+depends on them, so the critical path starts first.
+
+With fuse=True, a stale step whose only stale consumer is another target runs
+in the same process as it, so its result is passed in memory instead of being
+loaded from its dump, which is written in the background (see Step.execute()).
+"""
+import logging
+import os
+import subprocess
+import sys
+import time
+
+from . import drake
+
+
+def total_memory():
+    """
+    Returns: the physical memory of this machine in bytes, or None if unknown
+    """
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def successors(data):
+    """
+    Args:
+        data: a dict of step: target inputs, see drake.get_drake_data()
+    Returns: a dict of step: the set of steps which it is an input to
+    """
+    s = {step: set() for step in data}
+    for step, inputs in data.items():
+        for i in inputs:
+            s[i].add(step)
+    return s
+
+
+def priorities(data, durations, default_duration=1.0):
+    """
+    Compute the critical path priority of each step: its duration plus the
+    longest total duration of a chain of steps depending on it
+    Args:
+        data: a dict of step: target inputs, see drake.get_drake_data()
+        durations: a dict of step: duration in seconds or None if unknown
+        default_duration: the duration of steps with unknown duration
+    Returns: a dict of step: priority
+    """
+    succ = successors(data)
+    priority = {}
+
+    def visit(step):
+        if step not in priority:
+            d = durations.get(step)
+            priority[step] = (d if d is not None else default_duration) + \
+                max([visit(s) for s in succ[step]] + [0])
+        return priority[step]
+
+    for step in data:
+        visit(step)
+    return priority
+
+
+def stale(data):
+    """
+    Find the steps that need to run, as drake would, see drake.status()
+    Args:
+        data: a dict of step: target inputs, see drake.get_drake_data()
+    Returns: the set of stale steps
+    """
+    return set(step for step, reasons in drake.status(data).items() if len(reasons) > 0)
+
+
+def fuse(data, steps):
+    """
+    Group steps into chains to run in one process: each step whose only
+    consumer among the steps is another step joins its consumer's group
+    Args:
+        data: a dict of step: target inputs, see drake.get_drake_data()
+        steps: the steps to group, e.g. the stale steps
+    Returns: a dict of the last step of each group: the set of steps in the group
+    """
+    succ = successors(data)
+    root = {}
+
+    def visit(step):
+        if step not in root:
+            consumers = [s for s in succ[step] if s in steps]
+            root[step] = visit(consumers[0]) if len(consumers) == 1 else step
+        return root[step]
+
+    groups = {}
+    for step in steps:
+        groups.setdefault(visit(step), set()).add(step)
+    return groups
+
+
+def run_step_args(step, inputs, outputs=None):
+    """
+    Args:
+        step: the step to execute
+        inputs: its target inputs to load
+        outputs: the steps to dump, defaulting to the step if it is a target
+    Returns: the arguments to run_step.py, as in the drain() method of the Drakefile
+    """
+    if outputs is None:
+        outputs = [step] if step.target else []
+    args = sorted(o._target_filename for o in outputs)
+    args.append(step._yaml_filename)
+    args.extend(i._target_filename for i in inputs)
+    return args
+
+
+class SubprocessLauncher(object):
+    """
+    Runs each step in a run_step.py subprocess, writing its output to drain.log
+    in the step's output directory
+    """
+    def __init__(self, bindir=None, python=sys.executable):
+        if bindir is None:
+            bindir = os.path.join(os.path.dirname(__file__), '..', 'bin')
+        self.bindir = bindir
+        self.python = python
+
+    def __call__(self, step, inputs, outputs=None):
+        """
+        Args:
+            outputs: the steps to dump, see run_step_args()
+        Returns: an object with a poll() method returning None while the step
+            is running and its exit code when it is done, e.g. a subprocess.Popen
+        """
+        command = [self.python, os.path.join(self.bindir, 'run_step.py')] + \
+            run_step_args(step, inputs, outputs)
+        with open(os.path.join(step._output_dirname, 'drain.log'), 'w') as log:
+            return subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+
+
+class Scheduler(object):
+    def __init__(self, cores=None, memory=None, launcher=None,
+                 default_duration=1.0, poll_interval=0.1, fuse=False):
+        """
+        Args:
+            cores: number of cores available, defaults to the number of CPUs
+            memory: bytes of memory available, defaults to the physical memory.
+                Steps with unknown memory use are assumed to use none.
+            launcher: callable taking a step and its target inputs and returning
+                a process, see SubprocessLauncher. Fused groups of steps are
+                launched with an additional outputs argument.
+            default_duration: assumed duration of steps which were not profiled
+            poll_interval: seconds between polls of running steps
+            fuse: run chains of stale steps in one process, see fuse()
+        """
+        if cores is None:
+            import multiprocessing
+            cores = multiprocessing.cpu_count()
+        if memory is None:
+            memory = total_memory()
+
+        self.cores = cores
+        self.memory = memory
+        self.launcher = launcher if launcher is not None else SubprocessLauncher()
+        self.default_duration = default_duration
+        self.poll_interval = poll_interval
+        self.fuse = fuse
+
+    def _resources(self, step):
+        resources = step.get_resources()
+        cores = min(resources.get('cores') or 1, self.cores)
+        memory = resources.get('memory') or 0
+        if self.memory is not None:
+            memory = min(memory, self.memory)
+        return cores, memory, resources.get('duration')
+
+    def run(self, workflow, force=False):
+        """
+        Run the stale target steps of the workflow and wait for them to finish.
+        After a step fails no more steps are started.
+        Args:
+            workflow: collection of steps
+            force: run all steps, not just stale ones
+        Returns: the set of failed steps, including all steps of a failed fused group
+        """
+        data = drake.get_drake_data(workflow)
+        for step in data:
+            step.setup_dump()
+
+        steps = set(data) if force else stale(data)
+        resources = {step: self._resources(step) for step in steps}
+        priority = priorities(data, {s: r[2] for s, r in resources.items()},
+                              self.default_duration)
+
+        # each group is launched as its last step, which executes the others
+        if self.fuse:
+            groups = fuse(data, steps)
+        else:
+            groups = {step: {step} for step in steps}
+        group_of = {s: root for root, group in groups.items() for s in group}
+        group_inputs = {root: set(i for s in group for i in data[s] if i not in group)
+                        for root, group in groups.items()}
+        for root, group in groups.items():
+            # steps in a group run one after another and keep their results in memory
+            resources[root] = (max(resources[s][0] for s in group),
+                               sum(resources[s][1] for s in group), None)
+            priority[root] = max(priority[s] for s in group)
+        logging.info('Scheduling %s of %s steps in %s processes' %
+                     (len(steps), len(data), len(groups)))
+
+        waiting = set(groups)
+        running = {}
+        failed = set()
+        free_cores, free_memory = self.cores, self.memory
+
+        while len(running) > 0 or (len(waiting) > 0 and len(failed) == 0):
+            if len(failed) == 0:
+                ready = [s for s in waiting
+                         if not any(group_of.get(i) in waiting or group_of.get(i) in running
+                                    for i in group_inputs[s])]
+                ready.sort(key=lambda s: priority[s], reverse=True)
+                for step in ready:
+                    cores, memory, duration = resources[step]
+                    fits = cores <= free_cores and \
+                        (free_memory is None or memory <= free_memory)
+                    # an oversized step runs alone
+                    if fits or len(running) == 0:
+                        logging.info('Launching %s' % step._output_dirname)
+                        if len(groups[step]) > 1:
+                            running[step] = self.launcher(step, group_inputs[step],
+                                                          outputs=groups[step])
+                        else:
+                            running[step] = self.launcher(step, group_inputs[step])
+                        waiting.remove(step)
+                        free_cores -= cores
+                        if free_memory is not None:
+                            free_memory -= memory
+
+            finished = [(s, p.poll()) for s, p in running.items()]
+            finished = [(s, code) for s, code in finished if code is not None]
+            for step, code in finished:
+                del running[step]
+                cores, memory, duration = resources[step]
+                free_cores += cores
+                if free_memory is not None:
+                    free_memory += memory
+                if code != 0:
+                    logging.error('Step failed with exit code %s: %s' %
+                                  (code, step._output_dirname))
+                    failed.update(groups[step])
+
+            if len(finished) == 0:
+                time.sleep(self.poll_interval)
+
+        return failed
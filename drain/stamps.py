@@ -0,0 +1,192 @@
+"""
+Content-hash invalidation of step sources and dependencies. drake reruns a
+step when one of its files is newer than its target, so touching a file
+without changing it, e.g. by switching git branches, reruns every step which
+depends on it. When ENABLED, a step depends instead on a stamp in
+drain.PATH/.stamps for each of its dependencies and step classes, which is
+only rewritten when the hash of its content changes. The source of each step
+class and its base classes is hashed rather than its whole file, so editing
+one class does not rerun the steps of other classes in the same file, but
+neither does editing a module-level function that a class calls.
+
+Hashes are cached by inode, mtime and size in .stamps/digests.yaml so that
+unchanged files are not read. See drake.get_dependencies().
+
+drake.status() computes stamps without writing them, with write=False, and
+reads their mtimes with mtime(), which returns the mtime a stamp would have.
+"""
+import hashlib
+import inspect
+import linecache
+import os
+import time
+
+import yaml
+
+import drain
+from . import util
+
+DIRNAME = '.stamps'
+DIGESTS_FILENAME = 'digests.yaml'
+
+# set from the DRAINCONTENTHASH environment variable in drain/__init__.py
+ENABLED = False
+
+# key: [inode, mtime, size, digest], loaded from DIGESTS_FILENAME
+_digests = None
+_modified = False
+# stamp filename: the mtime it would have if it were written, see _stamp()
+_unwritten = {}
+
+
+def _dirname():
+    return os.path.join(drain.PATH, DIRNAME)
+
+
+def _load_digests():
+    global _digests
+    if _digests is None:
+        filename = os.path.join(_dirname(), DIGESTS_FILENAME)
+        _digests = {}
+        if os.path.isfile(filename):
+            with open(filename) as f:
+                _digests = yaml.safe_load(f) or {}
+    return _digests
+
+
+def save():
+    """
+    Write the cache of digests if it was modified
+    """
+    global _modified
+    if _modified:
+        if not os.path.isdir(_dirname()):
+            os.makedirs(_dirname())
+        util.atomic_write(os.path.join(_dirname(), DIGESTS_FILENAME),
+                          yaml.safe_dump(_digests, default_flow_style=False))
+        _modified = False
+
+
+def _cached_digest(key, filename, compute):
+    """
+    Returns: the digest cached for key if the file has not changed since, else compute()
+    """
+    global _modified
+    st = os.stat(filename)
+    stat = [st.st_ino, st.st_mtime, st.st_size]
+
+    digests = _load_digests()
+    if key in digests and digests[key][:3] == stat:
+        return digests[key][3]
+
+    digest = compute()
+    digests[key] = stat + [digest]
+    _modified = True
+    return digest
+
+
+def file_digest(filename):
+    """
+    Returns: the hex sha256 hash of the file's contents
+    """
+    from .cache import sha256
+    filename = os.path.abspath(filename)
+    return _cached_digest(filename, filename, lambda: sha256(filename))
+
+
+def class_digest(cls):
+    """
+    Returns: the hex sha256 hash of the source of the class and of its base
+        classes which are not in the drain library or builtin
+    """
+    h = hashlib.sha256()
+    for c in inspect.getmro(cls):
+        try:
+            filename = os.path.abspath(inspect.getsourcefile(c))
+        except TypeError:
+            # builtin
+            continue
+        if filename.startswith(os.path.dirname(__file__)):
+            continue
+
+        key = '%s.%s' % (c.__module__, c.__name__)
+        # inspect reads sources through linecache, which may be out of date
+        linecache.checkcache(filename)
+        h.update(_cached_digest(
+                key, filename,
+                lambda: hashlib.sha256(inspect.getsource(c).encode('utf-8')).hexdigest()
+        ).encode('utf-8'))
+    return h.hexdigest()
+
+
+def _stamp(name, digest, mtime, write=True):
+    """
+    Write the digest to the stamp with the given name unless it is unchanged.
+    A new stamp gets the given mtime so that enabling stamps reruns nothing.
+    Args:
+        write: whether to write the stamp. If not, the mtime it would have is
+            recorded for mtime() instead.
+    Returns: the stamp filename
+    """
+    filename = os.path.join(_dirname(), name)
+    try:
+        with open(filename) as f:
+            current = f.read()
+    except IOError:
+        current = None
+
+    _unwritten.pop(filename, None)
+    if current != digest and not write:
+        _unwritten[filename] = mtime if current is None else time.time()
+    elif current != digest:
+        if not os.path.isdir(_dirname()):
+            os.makedirs(_dirname())
+        util.atomic_write(filename, digest)
+        if current is None:
+            os.utime(filename, (mtime, mtime))
+    return filename
+
+
+def mtime(filename):
+    """
+    Returns: the mtime of a file or of a stamp as it would be written, see
+        _stamp(), or None if the file is missing
+    """
+    if filename in _unwritten:
+        return _unwritten[filename]
+    try:
+        return os.stat(filename).st_mtime
+    except OSError:
+        return None
+
+
+def files(filenames, write=True):
+    """
+    Args:
+        write: whether to write changed stamps, see _stamp()
+    Returns: the stamps of the given files, e.g. a step's dependencies.
+        Missing files are returned as they are, so they are reported as missing.
+    """
+    stamps = []
+    for filename in filenames:
+        if not os.path.isfile(filename):
+            stamps.append(filename)
+            continue
+        path_digest = hashlib.md5(os.path.abspath(filename).encode('utf-8')).hexdigest()
+        name = '%s-%s' % (os.path.basename(filename), path_digest[:8])
+        stamps.append(_stamp(name, file_digest(filename), os.path.getmtime(filename), write))
+    return stamps
+
+
+def classes(classes, write=True):
+    """
+    Args:
+        write: whether to write changed stamps, see _stamp()
+    Returns: the stamps of the given step classes
+    """
+    stamps = []
+    for cls in classes:
+        source_mtime = os.path.getmtime(inspect.getsourcefile(cls))
+        name = '%s.%s' % (cls.__module__, cls.__name__)
+        stamps.append(_stamp(name, class_digest(cls), source_mtime, write))
+    return stamps
@@ -1,33 +1,302 @@
 import yaml
 
 import collections
-import inspect
 import pandas as pd
 from cached_property import cached_property
+import six
 from six import string_types
-from six.moves import zip_longest
+from six.moves import queue, zip_longest
 
-from sklearn.base import _pprint
 import joblib
 import os
 import traceback
 import hashlib
 import logging
 import shutil
+import sys
+import threading
+import time
+import uuid
 import warnings
-from tables import NaturalNameWarning
 
-from . import util
+from . import util, catalog, cache, profiling
 import drain
 
-_STEP_CACHE = {}
 
+def result_nbytes(result):
+    """
+    Returns: the approximate memory usage of a step result in bytes, counting
+        the pandas and numpy objects it contains
+    """
+    if isinstance(result, pd.DataFrame):
+        return int(result.memory_usage(index=True).sum())
+    elif isinstance(result, pd.Series):
+        # an int rather than a Series of the usage of each column
+        return int(result.memory_usage(index=True))
+    elif hasattr(result, 'nbytes'):
+        return int(result.nbytes)
+    elif isinstance(result, dict):
+        return sum(result_nbytes(r) for r in result.values())
+    elif isinstance(result, (list, tuple, Arguments)):
+        values = result.args + list(result.kwargs.values()) \
+            if isinstance(result, Arguments) else result
+        return sum(result_nbytes(r) for r in values)
+    else:
+        return 0
+
+
+def _format_kwargs(kwargs, offset=0, width=75):
+    """
+    Format keyword arguments as in sklearn's _pprint(), sorted and wrapped,
+    without importing sklearn, since every step is logged as it runs
+    Args:
+        offset: the width of the text preceding the arguments, e.g. the class name
+        width: the width after which to wrap lines
+    Returns: a string like "a=1, b='c'"
+    """
+    indent = ' ' * (offset + 1)
+    lines = []
+    line = ''
+    for k, v in sorted(kwargs.items()):
+        if isinstance(v, float):
+            v = str(v)
+        else:
+            v = repr(v)
+        if len(v) > 500:
+            v = v[:300] + '...' + v[-100:]
+        arg = '%s=%s' % (k, v)
+
+        if len(line) == 0:
+            line = arg
+        elif len(line) + len(arg) + 2 + len(indent) > width or '\n' in arg:
+            lines.append(line + ',')
+            line = indent + arg
+        else:
+            line += ', ' + arg
+    lines.append(line)
+
+    # strip trailing spaces
+    return '\n'.join(line.rstrip(' ') for line in lines)
+
+
+# hidden so that a temporary dump directory left by a killed run is never loaded
+TEMP_PREFIX = '.dump-'
+
+
+def _mkdtemp(dirname):
+    """
+    Create a new temporary dump directory in dirname. Unlike tempfile.mkdtemp(),
+    its permissions follow the umask, like those of the dump it replaces,
+    so that dumps in a shared drain.PATH stay readable by other users.
+    Returns: the directory
+    """
+    tempdir = os.path.join(dirname, TEMP_PREFIX + uuid.uuid4().hex)
+    os.mkdir(tempdir)
+    return tempdir
+
+
+# loaded steps keyed by digest, see load() and configure_cache()
+_STEP_CACHE = util.LRUCache(maxsize=1024, maxbytes=2**33,
+                            sizeof=lambda s: result_nbytes(s.result))
+
+
+def configure_cache(maxsize=1024, maxbytes=2**33):
+    """
+    Replace the cache of loaded steps used by load()
+    Args:
+        maxsize: maximum number of cached steps, None for unbounded
+        maxbytes: maximum memory usage of cached results, None for unbounded
+    """
+    global _STEP_CACHE
+    _STEP_CACHE = util.LRUCache(maxsize=maxsize, maxbytes=maxbytes,
+                                sizeof=lambda s: result_nbytes(s.result))
+
+
+# marks a missing argument in Step.__init__()
+_MISSING = object()
+
+# default storage policy for HDF dumps, see hdf_args() and Step.storage
+# set from the DRAINSTORAGE environment variable in drain/__init__.py
+STORAGE = {}
+
+# maximum bytes of results queued for a background dump, which throttles
+# execution while the writer catches up, see Dumper. It does not bound memory,
+# since results stay referenced by their steps after they are dumped.
+# None for unbounded, set from the DRAINDUMPBYTES environment variable in drain/__init__.py
+DUMP_MAXBYTES = 2**31
+
+# blosc compressors, which require PyTables to be built with blosc
+_BLOSC_CODECS = ['blosclz', 'lz4', 'lz4hc', 'snappy', 'zstd']
+
+
+def hdf_args(storage):
+    """
+    Translate a storage policy into arguments for writing pandas objects to HDF
+    Args:
+        storage: a dict with optional keys:
+            codec: compression library: zlib, bzip2, lzo, blosc or a blosc
+                compressor (lz4, lz4hc, zstd, snappy, blosclz), e.g. 'zstd'
+                is short for 'blosc:zstd'
+            level: compression level from 0 to 9, defaults to 5 when codec is set
+            format: 'fixed' (the default) or 'table'
+            chunksize: number of rows written at a time in table format
+            expectedrows: expected number of rows, used by PyTables to choose
+                the chunk shape in table format
+            data_columns: columns to index for where queries in table format
+            layout, n_jobs, backend: how collections are dumped, see write_hdf_split()
+    Returns: a pair of dicts (store_args, put_args) for HDFStore() and
+        HDFStore.put() or HDFStore.append()
+    """
+    store_args = {}
+    codec = storage.get('codec')
+    level = storage.get('level')
+    if codec is not None:
+        store_args['complib'] = 'blosc:' + codec if codec in _BLOSC_CODECS else codec
+        store_args['complevel'] = level if level is not None else 5
+    elif level is not None:
+        store_args['complevel'] = level
+
+    put_args = {'format': storage.get('format', 'fixed')}
+    if put_args['format'] == 'table':
+        put_args.update(util.dict_subset(storage, ('chunksize', 'expectedrows',
+                                                   'data_columns')))
+
+    return store_args, put_args
+
+
+def write_hdf(filename, objects, storage=None):
+    """
+    Write pandas objects to a new HDF file
+    Args:
+        filename: the file, which is overwritten
+        objects: a collection of (key, DataFrame or Series) pairs
+        storage: storage policy, see hdf_args(), defaults to STORAGE
+    """
+    from tables import NaturalNameWarning
+
+    store_args, put_args = hdf_args(storage if storage is not None else STORAGE)
+    store = pd.HDFStore(filename, mode='w', **store_args)
+    # ignore NaturalNameWarning
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=NaturalNameWarning)
+        for key, df in objects:
+            if put_args['format'] == 'table':
+                store.append(key, df, **put_args)
+            else:
+                store.put(key, df, **put_args)
+    store.close()
+
+
+def _select(df, columns=None, where=None):
+    if where is not None:
+        df = df.query(where)
+    if columns is not None and isinstance(df, pd.DataFrame):
+        df = df[[c for c in columns if c in df.columns]]
+    return df
+
+
+def read_hdf(filename, key='df', columns=None, where=None):
+    """
+    Read a pandas object from HDF, selecting a subset of its columns and rows.
+    Both are pushed down to PyTables when the object was written in table
+    format, see hdf_args(). Otherwise the object is read in full and then subset.
+    Args:
+        filename: the file
+        key: the key of the object
+        columns: the columns to read, ignored for a Series. Columns not in the
+            object are skipped so that the same list can be used across a collection.
+        where: a row condition such as "date >= '2015-01-01'", which may reference
+            the index and columns. In table format, conditions on columns other
+            than data_columns are evaluated after reading.
+    Returns: the DataFrame or Series
+    """
+    store = pd.HDFStore(filename, mode='r')
+    try:
+        storer = store.get_storer(key)
+        if not storer.is_table or (columns is None and where is None):
+            return _select(store[key], columns, where)
+
+        if columns is not None and storer.pandas_type == 'frame_table':
+            stored = set(storer.non_index_axes[0][1])
+            columns = [c for c in columns if c in stored]
+        else:
+            columns = None
+
+        try:
+            return store.select(key, where=where, columns=columns)
+        except ValueError:
+            logging.debug('Could not push down %s to %s, filtering after read'
+                          % (where, filename))
+            return _select(store[key], columns, where)
+    finally:
+        store.close()
+
+
+def _storage_parallel(storage):
+    return joblib.Parallel(n_jobs=storage.get('n_jobs', 1),
+                           backend=storage.get('backend', 'threading'))
+
+
+def write_hdf_split(dirname, objects, storage=None):
+    """
+    Write a collection of pandas objects to one HDF file per key in parallel,
+    along with a manifest.yaml of the keys. Used by Step.dump() when the
+    storage policy has layout='split'.
+    Args:
+        dirname: the directory, which must exist
+        objects: a list or tuple of pandas objects, or a dict of them
+        storage: storage policy, see hdf_args(), defaults to STORAGE. Also:
+            n_jobs: number of objects written at a time, default 1
+            backend: joblib backend, default 'threading', which is only safe
+                if HDF5 was built thread-safe. Use 'loky' otherwise.
+    """
+    storage = storage if storage is not None else STORAGE
+    if isinstance(objects, dict):
+        manifest = {'type': 'dict', 'keys': list(objects.keys())}
+        values = list(objects.values())
+    else:
+        manifest = {'type': 'list', 'keys': list(range(len(objects)))}
+        values = objects
+
+    _storage_parallel(storage)(
+            joblib.delayed(write_hdf)(os.path.join(dirname, '%s.h5' % i), [('df', v)], storage)
+            for i, v in enumerate(values))
 
-def load(steps, reload=False):
+    # written last so that an incomplete dump has no manifest
+    with open(os.path.join(dirname, 'manifest.yaml'), 'w') as f:
+        yaml.safe_dump(manifest, f)
+
+
+def read_hdf_split(dirname, storage=None, columns=None, where=None):
+    """
+    Read a collection written by write_hdf_split() in parallel
+    Args:
+        dirname: the directory
+        storage: storage policy whose n_jobs and backend are used, defaults to STORAGE
+        columns, where: subset each object, see read_hdf()
+    Returns: a list or dict of pandas objects
+    """
+    storage = storage if storage is not None else STORAGE
+    with open(os.path.join(dirname, 'manifest.yaml')) as f:
+        manifest = yaml.safe_load(f)
+
+    values = _storage_parallel(storage)(
+            joblib.delayed(read_hdf)(os.path.join(dirname, '%s.h5' % i), 'df', columns, where)
+            for i in range(len(manifest['keys'])))
+
+    if manifest['type'] == 'dict':
+        return dict(zip(manifest['keys'], values))
+    else:
+        return values
+
+
+def load(steps, reload=False, n_jobs=1):
     """
     safely load steps in place, excluding those that fail
     Args:
         steps: the steps to load
+        reload: whether to clear the cache of loaded steps first
+        n_jobs: number of threads used to load steps
     """
     # work on collections by default for fewer isinstance() calls per call to load()
     if reload:
@@ -39,28 +308,160 @@ def load(steps, reload=False):
     if not isinstance(steps, collections.Iterable):
         return load([steps])[0]
 
-    loaded = []
-    for s in steps:
+    steps = list(steps)
+    progress = {'loaded': 0, 'failed': 0}
+    lock = threading.Lock()
+
+    def load_step(s):
         digest = s._digest
-        if digest in _STEP_CACHE:
-            loaded.append(_STEP_CACHE[digest])
-        else:
+        cached = _STEP_CACHE.get(digest)
+        if cached is not None:
+            return cached
+
+        start = time.time()
+        try:
+            s.load()
+        except(Exception):
+            logging.warn('Error during step load:\n%s' %
+                         util.indent(traceback.format_exc()))
+            with lock:
+                progress['failed'] += 1
+            return None
+
+        _STEP_CACHE.put(digest, s)
+        with lock:
+            progress['loaded'] += 1
+            logging.info('Loaded %s/%s steps in %.2fs: %s' % (
+                    progress['loaded'], len(steps), time.time() - start,
+                    s._output_dirname))
+        return s
+
+    loaded = joblib.Parallel(n_jobs=n_jobs, backend='threading')(
+            joblib.delayed(load_step)(s) for s in steps)
+
+    if progress['failed'] > 0:
+        logging.warning('Failed to load %s of %s steps' % (progress['failed'], len(steps)))
+
+    return [s for s in loaded if s is not None]
+
+
+class Dumper(object):
+    """
+    Dumps the output steps of an execution in a background thread, in the
+    order they are submitted, so that their consumers run while they are
+    written. See Step.execute().
+    """
+    # seconds between checks that the thread is running while waiting for it
+    POLL_INTERVAL = 1.0
+
+    def __init__(self, maxbytes=None):
+        """
+        Args:
+            maxbytes: maximum total size of the results queued to be dumped,
+                defaults to DUMP_MAXBYTES, which is None for unbounded.
+                submit() blocks until there is room, but a result is always
+                accepted when no other is waiting. This limits how far execution
+                runs ahead of the writer, not the memory used by results,
+                which stay referenced by their steps after they are dumped.
+        """
+        self.maxbytes = maxbytes if maxbytes is not None else DUMP_MAXBYTES
+        self._queue = queue.Queue()
+        self._done = {}
+        self._error = None
+        self._pending = 0
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._loop)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, step, fetched=False):
+        """
+        Queue an executed step to be dumped, see Step._finish_dump()
+        """
+        # a fetched step's dump is already written
+        nbytes = 0 if fetched else result_nbytes(step.result)
+        with self._condition:
+            self._check_alive()
+            while self._pending > 0 and self.maxbytes is not None and \
+                    self._pending + nbytes > self.maxbytes:
+                self._condition.wait(self.POLL_INTERVAL)
+                self._check_alive()
+            self._pending += nbytes
+
+        self._done[step] = threading.Event()
+        self._queue.put((step, fetched, nbytes))
+
+    def _loop(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            step, fetched, nbytes = item
             try:
-                s.load()
-                _STEP_CACHE[digest] = s
-                loaded.append(s)
-            except(Exception):
-                logging.warn('Error during step load:\n%s' %
-                             util.indent(traceback.format_exc()))
+                step._finish_dump(fetched)
+            except BaseException:
+                if self._error is None:
+                    self._error = sys.exc_info()
+                try:
+                    description = util.indent(str(step))
+                except Exception:
+                    description = step.__class__.__name__
+                logging.error('Failed to dump\n%s\n%s' %
+                              (description, traceback.format_exc()))
+            finally:
+                with self._condition:
+                    self._pending -= nbytes
+                    self._condition.notify_all()
+                self._done[step].set()
+
+    def wait(self, steps):
+        """
+        Wait until those of the given steps which were submitted are dumped
+        """
+        for step in steps:
+            if step in self._done:
+                while not self._done[step].wait(self.POLL_INTERVAL):
+                    self._check_alive()
+        self.check()
+
+    def close(self):
+        """
+        Wait until all submitted steps are dumped and stop the thread
+        """
+        self._queue.put(None)
+        self._thread.join()
 
-    return loaded
+    def check(self):
+        """
+        Raise the error of the first failed dump, if any
+        """
+        if self._error is not None:
+            six.reraise(*self._error)
+
+    def _check_alive(self):
+        """
+        Raise instead of waiting for a thread which has stopped
+        """
+        if not self._thread.is_alive():
+            self.check()
+            raise RuntimeError('Dumper thread is not running')
 
 
 class Step(object):
+    # storage policy for HDF dumps, merged over the global STORAGE, see hdf_args()
+    # set on a subclass so that it applies when run by run_step.py
+    storage = None
+    # the arguments this step's result was loaded with, see execute()
+    _load_args = None
+    # resource hints for schedulers, a dict with optional keys cores, memory (bytes)
+    # and duration (seconds), see get_resources()
+    resources = None
+    # whether run() modifies its input results in place, in which case it waits
+    # for them to be dumped when they are dumped in the background, see Dumper
+    modifies_inputs = False
+
     def __new__(cls, *args, **kwargs):
-        # use inspection to get positional argument names
-        argspec = inspect.getargspec(cls.__init__)
-        nargs = zip(argspec.args[1:len(args)+1], args)
+        nargs = zip(cls._init_argnames()[:len(args)], args)
         kwargs.update(nargs)
 
         obj = object.__new__(cls)
@@ -68,6 +469,19 @@ class Step(object):
 
         return obj
 
+    @classmethod
+    def _init_argnames(cls):
+        """
+        Returns: the names of the positional arguments of this class's __init__,
+            used to name positional arguments in __new__. Inspected once per class.
+        """
+        # not inherited since a subclass may override __init__
+        argnames = cls.__dict__.get('_argnames')
+        if argnames is None:
+            argnames = util.get_argspec(cls.__init__).args[1:]
+            cls._argnames = argnames
+        return argnames
+
     def __init__(self, inputs=None, dependencies=None, **kwargs):
         """
         initialize name and target attributes
@@ -76,62 +490,235 @@ class Step(object):
         self.target = False
         self.name = None
 
-        if not hasattr(self, 'inputs'):
+        if 'inputs' not in self.__dict__:
             self.inputs = inputs if inputs is not None else []
         self.dependencies = dependencies if dependencies is not None else []
 
         for k, v in kwargs.items():
-            setattr(self, k, v)
+            # arguments passed through unchanged are read from _kwargs, see __getattr__(),
+            # unless they would be shadowed by an attribute, e.g. target or storage
+            if self._kwargs.get(k, _MISSING) is not v or \
+                    k in self.__dict__ or hasattr(type(self), k):
+                setattr(self, k, v)
+
+    def __getattr__(self, name):
+        """
+        Fall back to the constructor's arguments, so that each step stores
+        them once rather than in both _kwargs and its __dict__
+        """
+        kwargs = self.__dict__.get('_kwargs')
+        if kwargs is None or name not in kwargs or name.startswith('__'):
+            raise AttributeError("'%s' object has no attribute '%s'" %
+                                 (self.__class__.__name__, name))
+        return kwargs[name]
 
-    def execute(self, inputs=None, output=None, load_targets=False):
+    def execute(self, inputs=None, output=None, load_targets=False, keep_previous=False):
         """
         Run this step, recursively running or loading inputs.
         Used in bin/run_step.py which is run by drake.
         Args:
             inputs: collection of steps that should be loaded
-            output: step that should be dumped after it is run
+            output: step that should be dumped after it is run, or a collection
+                of steps to dump, e.g. a chain of targets fused into one process
+                by the native scheduler. Results are passed between them in
+                memory and, when there are several, dumped in the background
+                by a Dumper while execution continues.
             load_targets (boolean): load all steps which are targets.
                 This argument is not used by run_step.py because target
                 does not get serialized. But it can be useful for
                 running steps directly.
+            keep_previous: keep the outputs' previous dumps and targets until
+                the new dumps are committed, see _commit_dump()
+        Outputs are fetched from the shared cache instead of run if possible
+        and stored in it after they are dumped, see drain.cache.
         """
-        if self == output:
-            if os.path.exists(self._dump_dirname):
-                shutil.rmtree(self._dump_dirname)
-            if os.path.exists(self._target_filename):
-                os.remove(self._target_filename)
-            os.makedirs(self._dump_dirname)
-
         if inputs is None:
             inputs = []
 
-        if not hasattr(self, 'result'):
-            if self in inputs or (load_targets and self.target):
-                logging.info('Loading\n%s' % util.indent(str(self)))
-                self.load()
+        if output is None:
+            outputs = set()
+        elif isinstance(output, Step):
+            outputs = {output}
+        else:
+            outputs = set(output)
+
+        dumper = Dumper() if len(outputs) > 1 else None
+        try:
+            self._execute(inputs, outputs, load_targets, {}, keep_previous, dumper)
+        finally:
+            if dumper is not None:
+                dumper.close()
+        if dumper is not None:
+            dumper.check()
+
+    def _execute(self, inputs, outputs, load_targets, load_args, keep_previous, dumper):
+        """
+        Recursive part of execute()
+        Args:
+            outputs: set of steps left to dump. Each is removed when it is reached
+                so that a step reached again through another consumer is not redumped.
+            load_args: arguments to load() if this step is loaded, passed by
+                the consuming step, see get_load_args()
+            dumper: a Dumper for the outputs or None to dump them synchronously
+        """
+        dump = self in outputs
+        if dump:
+            outputs.remove(self)
+            self._begin_dump(keep_previous)
+
+        fetched = False
+        try:
+            if self._load_args and self._load_args != load_args:
+                # partially loaded for another consumer, reload in full
+                del self.result
+                load_args = {}
+
+            if not hasattr(self, 'result'):
+                # measurements of a previous execution, see profiling.measure()
+                self.__dict__.pop('_profile', None)
+                if self in inputs or (load_targets and self.target):
+                    logging.info('Loading\n%s' % util.indent(str(self)))
+                    with profiling.measure(self, 'load'):
+                        if load_args:
+                            self.load(**load_args)
+                        else:
+                            self.load()
+                    self._load_args = load_args
+                elif dump and self._fetch():
+                    fetched = True
+                else:
+                    for i in self.inputs:
+                        i._execute(inputs, outputs, load_targets, self.get_load_args(i),
+                                   keep_previous, dumper)
+
+                    if self.modifies_inputs and dumper is not None:
+                        dumper.wait(self.get_inputs())
+                    args = merge_results(self.inputs)
+                    logging.info('Running\n%s' % util.indent(str(self)))
+                    with profiling.measure(self, 'run'):
+                        self.result = self.run(*args.args, **args.kwargs)
+        except BaseException:
+            if dump:
+                self._abort_dump()
+            raise
+
+        if dump:
+            if dumper is not None:
+                dumper.submit(self, fetched)
             else:
-                for i in self.inputs:
-                    i.execute(inputs=inputs, output=output,
-                              load_targets=load_targets)
+                self._finish_dump(fetched)
+
+    def _fetch(self):
+        """
+        Fetch this step's dump from the shared cache into its temporary dump
+        directory and load it. A dump which cannot be loaded counts as a miss.
+        Returns: whether the result was fetched and loaded
+        """
+        if not cache.get(self):
+            return False
+        try:
+            self.setup_dump()
+            self.load()
+        except Exception:
+            logging.warning('Could not load %s from cache\n%s' %
+                            (self._digest, traceback.format_exc()))
+            self.__dict__.pop('result', None)
+            shutil.rmtree(self._dump_dirname)
+            os.makedirs(self._dump_dirname)
+            return False
 
-                args = merge_results(self.inputs)
-                logging.info('Running\n%s' % util.indent(str(self)))
-                self.result = self.run(*args.args, **args.kwargs)
+        logging.info('Fetched from cache\n%s' % util.indent(str(self)))
+        return True
+
+    def _finish_dump(self, fetched=False):
+        """
+        Dump the result of an executed output step, commit the dump, profile and
+        catalog it and store it in the shared cache
+        Args:
+            fetched: whether the dump was fetched from the cache, so only needs committing
+        """
+        try:
+            if fetched:
+                self._commit_dump()
+                catalog.record(self)
+                return
 
-        if self == output:
             logging.info('Dumping\n%s' % util.indent(str(self)))
-            self.dump()
-            util.touch(self._target_filename)
+            with profiling.measure(self, 'dump'):
+                self.dump()
+            self._commit_dump()
+        except BaseException:
+            self._abort_dump()
+            raise
+
+        profile = profiling.write(self)
+        catalog.record(self, run_time=profiling.duration(profile, ['run']),
+                       dump_time=profiling.duration(profile, ['dump']))
+        cache.put(self)
+
+    def _begin_dump(self, keep_previous=False):
+        """
+        Redirect _dump_dirname to a new temporary directory beside it so that
+        the dump is written by run() and dump() without replacing the previous one
+        Args:
+            keep_previous: whether to keep the previous dump and target. If not,
+                they are removed now so the step is incomplete while it runs.
+        """
+        if not keep_previous:
+            # remove the target first so the step is never complete without a dump
+            if os.path.exists(self._target_filename):
+                os.remove(self._target_filename)
+            if os.path.exists(self._dump_dirname):
+                shutil.rmtree(self._dump_dirname)
 
-    @cached_property
-    def _hasher(self):
-        return hashlib.md5(yaml.dump(self).encode('utf-8'))
+        if not os.path.isdir(self._output_dirname):
+            os.makedirs(self._output_dirname)
+        # remove temporary directories left by killed runs
+        for name in os.listdir(self._output_dirname):
+            if name.startswith(TEMP_PREFIX):
+                shutil.rmtree(os.path.join(self._output_dirname, name), ignore_errors=True)
+
+        self.__dict__['_dump_dirname'] = _mkdtemp(self._output_dirname)
+
+    def _commit_dump(self):
+        """
+        Move the temporary dump directory into place and touch the target.
+        The dump is flushed to disk before it is renamed and the target is
+        touched last, so a complete target always has a complete dump.
+        """
+        tempdir = self.__dict__.pop('_dump_dirname')
+        dumpdir = self._dump_dirname
+        util.fsync_tree(tempdir)
+
+        if os.path.exists(self._target_filename):
+            os.remove(self._target_filename)
+
+        previous = None
+        if os.path.exists(dumpdir):
+            previous = _mkdtemp(self._output_dirname)
+            os.rename(dumpdir, os.path.join(previous, 'dump'))
+        os.rename(tempdir, dumpdir)
+        util.fsync(self._output_dirname)
+        if previous is not None:
+            shutil.rmtree(previous)
+
+        util.touch(self._target_filename)
+        util.fsync(self._target_filename)
+        util.fsync(self._output_dirname)
+
+    def _abort_dump(self):
+        """
+        Remove the temporary dump directory after a failed run or dump
+        """
+        tempdir = self.__dict__.pop('_dump_dirname', None)
+        if tempdir is not None and os.path.basename(tempdir).startswith(TEMP_PREFIX):
+            shutil.rmtree(tempdir, ignore_errors=True)
 
     @cached_property
     def _digest(self):
         """ Returns this Step's unique hash, which identifies the
         Step's dump on disk. Depends on the constructor's kwargs. """
-        return self._hasher.hexdigest()
+        return hashlib.md5(yaml.dump(self).encode('utf-8')).hexdigest()
 
     def get_input(self, value, _search=None):
         """
@@ -186,48 +773,99 @@ class Step(object):
                 d.pop(k)
         return d
 
-    @cached_property
+    # paths are derived from the digest when used rather than stored on each step
+
+    @property
     def _output_dirname(self):
         if drain.PATH is None:
             raise ValueError('drain.PATH not set')
 
         return os.path.join(drain.PATH, self.__class__.__name__, self._digest[0:8])
 
-    @cached_property
+    @property
     def _yaml_filename(self):
         return os.path.join(self._output_dirname, 'step.yaml')
 
-    @cached_property
+    @property
     def _dump_dirname(self):
+        # redirected to a temporary directory while dumping, see _begin_dump()
+        dirname = self.__dict__.get('_dump_dirname')
+        if dirname is not None:
+            return dirname
         return os.path.join(self._output_dirname, 'dump')
 
-    @cached_property
+    @property
     def _target_filename(self):
         return os.path.join(self._output_dirname, 'target')
 
+    @property
+    def _storage(self):
+        """
+        Returns: the storage policy of this step's dump
+        """
+        storage = dict(STORAGE)
+        if self.storage is not None:
+            storage.update(self.storage)
+        return storage
+
     def run(self):
         raise NotImplementedError
 
-    def load(self):
+    def get_resources(self):
+        """
+        Returns: a dict of the resources this step is expected to use when run by
+            run_step.py: cores, memory (bytes) and duration (seconds), each None if
+            unknown. Hints declared in self.resources take precedence over those
+            learned from the profile of the step's last execution.
+        """
+        resources = profiling.resources(profiling.read(self))
+        if self.resources is not None:
+            resources.update(self.resources)
+        return resources
+
+    def get_load_args(self, input):
+        """
+        Declare the part of an input's result that this step uses so that when
+        the input is loaded only that part is read. Override in subclasses.
+        Note that the input may still be loaded in full, e.g. when it is shared
+        with other steps, so run() should subset it as well.
+        Args:
+            input: one of this step's inputs
+        Returns: a dict of keyword arguments to input.load(), e.g.
+            {'columns': ['date', 'score'], 'where': "date == '2015-01-01'"}
+        """
+        return {}
+
+    def load(self, columns=None, where=None):
         """
         Load this step's result from its dump directory
+        Args:
+            columns, where: read only these columns and rows of each DataFrame
+                in the result, see read_hdf(). Ignored for pickled results.
         """
         hdf_filename = os.path.join(self._dump_dirname, 'result.h5')
-        if os.path.isfile(hdf_filename):
+        if os.path.isfile(os.path.join(self._dump_dirname, 'manifest.yaml')):
+            self.result = read_hdf_split(self._dump_dirname, self._storage,
+                                         columns=columns, where=where)
+        elif os.path.isfile(hdf_filename):
             store = pd.HDFStore(hdf_filename, mode='r')
             keys = store.keys()
+            store.close()
+
+            def read(key):
+                return read_hdf(hdf_filename, key, columns=columns, where=where)
+
             if keys == ['/df']:
-                self.result = store['df']
+                self.result = read('df')
             else:
                 if set(keys) == set(map(lambda i: '/%s' % i, range(len(keys)))):
                     # keys are not necessarily ordered
-                    self.result = [store[str(k)] for k in range(len(keys))]
+                    self.result = [read(str(k)) for k in range(len(keys))]
                 else:
-                    self.result = {k[1:]: store[k] for k in keys}
+                    self.result = {k[1:]: read(k) for k in keys}
 
         else:
-            self.result = joblib.load(
-                    os.path.join(self._output_dirname, 'dump', 'result.pkl'))
+            self.result = joblib.load(os.path.join(self._dump_dirname, 'result.pkl'))
 
     def setup_dump(self):
         """
@@ -254,14 +892,19 @@ class Step(object):
                     dump = True
 
         if dump:
-            with open(yaml_filename, 'w') as f:
-                yaml.dump(self, f)
+            util.atomic_write(yaml_filename, yaml.dump(self))
 
     def dump(self):
         self.setup_dump()
         if isinstance(self.result, pd.DataFrame):
-            self.result.to_hdf(os.path.join(self._dump_dirname, 'result.h5'), 'df')
+            write_hdf(os.path.join(self._dump_dirname, 'result.h5'),
+                      [('df', self.result)], self._storage)
         elif util.is_instance_collection(self.result, [pd.Series, pd.DataFrame]):
+            storage = self._storage
+            if storage.get('layout') == 'split':
+                write_hdf_split(self._dump_dirname, self.result, storage)
+                return
+
             if not isinstance(self.result, dict):
                 keys = map(str, range(len(self.result)))
                 values = self.result
@@ -269,24 +912,19 @@ class Step(object):
                 keys = self.result.keys()
                 values = self.result.values()
 
-            store = pd.HDFStore(os.path.join(self._dump_dirname, 'result.h5'))
-            # ignore NaturalNameWarning
-            with warnings.catch_warnings():
-                warnings.simplefilter('ignore', category=NaturalNameWarning)
-                for key, df in zip(keys, values):
-                    store.put(key, df, mode='w')
-                store.close()
+            write_hdf(os.path.join(self._dump_dirname, 'result.h5'),
+                      zip(keys, values), storage)
         else:
             joblib.dump(self.result, os.path.join(self._dump_dirname, 'result.pkl'))
 
     def __repr__(self):
         class_name = self.__class__.__name__
-        args = _pprint(self._kwargs, offset=len(class_name))
+        args = _format_kwargs(self._kwargs, offset=len(class_name))
         return '%s(%s)' % (class_name,
                            args.replace('\\n', '\n'))
 
     def __hash__(self):
-        return int(self._hasher.hexdigest(), 16)
+        return int(self._digest, 16)
 
     def __eq__(self, other):
         if not isinstance(other, Step):
@@ -532,9 +1170,10 @@ def _output_dirnames(workflow=None, leaf=False):
     """
     if workflow is None:
         dirs = set()
-        for cls in os.listdir(drain.PATH):
-            for step in os.listdir(os.path.join(drain.PATH, cls)):
-                dirs.add(os.path.join(drain.PATH, cls, step))
+        # skip hidden files such as the catalog
+        for cls in util.get_subdirs(drain.PATH):
+            if not os.path.basename(cls).startswith('.'):
+                dirs.update(util.get_subdirs(cls))
         return dirs
     else:
         if leaf:
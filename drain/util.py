@@ -1,7 +1,8 @@
-import sqlalchemy
+import inspect
 import logging
 import os
 import sys
+import threading
 
 import numpy as np
 import pandas as pd
@@ -9,6 +10,7 @@ import pandas.io.sql
 
 from itertools import chain, product
 from functools import reduce
+from collections import OrderedDict
 from datetime import datetime, timedelta, date
 
 try:
@@ -21,6 +23,7 @@ day = np.timedelta64(1, 'D')
 
 
 def create_engine():
+    import sqlalchemy
     return sqlalchemy.create_engine('postgresql://{user}:{pwd}@{host}:5432/{db}'.format(
             host=os.environ['PGHOST'], db=os.environ['PGDATABASE'], user=os.environ['PGUSER'],
             pwd=os.environ['PGPASSWORD']))
@@ -63,6 +66,57 @@ def touch(path):
     os.utime(path, None)
 
 
+def fsync(path):
+    """
+    Flush a file or directory to disk. Flushing a directory makes the
+    creation and renaming of its entries durable.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    except OSError:
+        # directories cannot be flushed on some platforms
+        pass
+    finally:
+        os.close(fd)
+
+
+def fsync_tree(directory):
+    """
+    Flush all of the files and directories in the given directory tree to disk
+    """
+    for root, dirs, files in os.walk(directory):
+        for f in files:
+            fsync(os.path.join(root, f))
+        fsync(root)
+
+
+def atomic_write(filename, content):
+    """
+    Write a string to a file by writing a temporary file beside it and
+    renaming it, so readers see either the old or the new content
+    """
+    tmp_filename = '%s.tmp-%s' % (filename, os.getpid())
+    with open(tmp_filename, 'w') as f:
+        f.write(content)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp_filename, filename)
+
+
+def dir_size(directory):
+    """
+    Returns: total size in bytes of the files in the given directory tree
+    """
+    size = 0
+    for root, dirs, files in os.walk(directory):
+        for f in files:
+            filename = os.path.join(root, f)
+            if not os.path.islink(filename):
+                size += os.path.getsize(filename)
+    return size
+
+
 def get_subdirs(directory):
     """
     Returns: a list of subdirectories of the given directory
@@ -140,6 +194,24 @@ def get_attr(name):
     return getattr(mod, cls)
 
 
+# getargspec is deprecated in Python 3 and removed in 3.11
+_getargspec = getattr(inspect, 'getfullargspec', None) or inspect.getargspec
+_ARGSPECS = {}
+
+
+def get_argspec(function):
+    """
+    Inspect the arguments of a function, caching the result
+    Args:
+        function: a function or method, whose underlying function is cached
+    Returns: an ArgSpec, or a FullArgSpec in Python 3. args includes self for methods.
+    """
+    key = getattr(function, '__func__', function)
+    if key not in _ARGSPECS:
+        _ARGSPECS[key] = _getargspec(function)
+    return _ARGSPECS[key]
+
+
 def init_object(name, **kwargs):
     return get_attr(name)(**kwargs)
 
@@ -258,16 +330,21 @@ def dict_expand(d, prefix=None):
     return result
 
 
-def nunique(iterable):
+def fingerprint(value):
+    """
+    Returns a hashable stand-in for value: the value itself when it is
+    hashable, otherwise its YAML serialization (as used for Step hashing)
+    """
     try:
-        return len(set(iterable))
+        hash(value)
+        return value
     except TypeError:
-        # use equals to count unhashable objects
-        unique = []
-        for i in iterable:
-            if i not in unique:
-                unique.append(i)
-        return len(unique)
+        import yaml
+        return (type(value), yaml.dump(value))
+
+
+def nunique(iterable):
+    return len(set(fingerprint(i) for i in iterable))
 
 
 def dict_diff(dicts):
@@ -277,14 +354,14 @@ def dict_diff(dicts):
     diff_keys = set()
 
     for k in union(set(d.keys()) for d in dicts):
-        values = []
+        values = set()
         for d in dicts:
             if k not in d:
                 diff_keys.add(k)
                 break
             else:
-                values.append(d[k])
-                if nunique(values) > 1:
+                values.add(fingerprint(d[k]))
+                if len(values) > 1:
                     diff_keys.add(k)
                     break
 
@@ -536,3 +613,60 @@ def is_instance_collection(c, cls):
             return False
 
     return True
+
+
+class LRUCache(object):
+    """
+    A thread-safe least recently used cache bounded by number of entries and
+    optionally by total size, as measured by the sizeof function.
+    """
+    def __init__(self, maxsize=None, maxbytes=None, sizeof=None):
+        """
+        Args:
+            maxsize: maximum number of entries, None for unbounded
+            maxbytes: maximum total size of entries, None for unbounded
+            sizeof: function returning the size of a value, required for maxbytes
+        """
+        if maxbytes is not None and sizeof is None:
+            raise ValueError('Need sizeof function for maxbytes')
+
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.sizeof = sizeof
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._entries:
+                return default
+            # move to the most recently used end
+            value, size = self._entries.pop(key)
+            self._entries[key] = (value, size)
+            return value
+
+    def put(self, key, value):
+        size = self.sizeof(value) if self.sizeof is not None else 0
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop(key)[1]
+            self._entries[key] = (value, size)
+            self.nbytes += size
+
+            # evict least recently used, but always keep the newest entry
+            while len(self._entries) > 1 and \
+                    ((self.maxsize is not None and len(self._entries) > self.maxsize) or
+                     (self.maxbytes is not None and self.nbytes > self.maxbytes)):
+                self.nbytes -= self._entries.popitem(last=False)[1][1]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
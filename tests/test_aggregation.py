@@ -80,3 +80,7 @@ def test_spacetime_join_fillna(drain_setup, spacetime_crime_agg):
         'date':[np.datetime64(date(2015,12,30)), np.datetime64(date(2015,12,31))]})
     print(spacetime_crime_agg.join(left))
 
+
+def test_storage_serial():
+    # HDF5 is not thread-safe, so parallel dumps are opt-in
+    assert SimpleAggregation.storage.get('n_jobs', 1) == 1
@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+import threading
+
+import pandas as pd
+import pytest
+
+from drain import cache
+from drain.step import Step
+
+runs = []
+
+
+class Numbers(Step):
+    def __init__(self, n):
+        Step.__init__(self, n=n)
+
+    def run(self):
+        runs.append(self.n)
+        return pd.DataFrame({'a': range(self.n)})
+
+
+class Count(Step):
+    def __init__(self, n):
+        Step.__init__(self, n=n)
+
+    def run(self):
+        runs.append(self.n)
+        return self.n
+
+
+@pytest.fixture
+def http_cache():
+    root = tempfile.mkdtemp()
+    server = cache.CacheServer(root, host='localhost')
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    # small chunks to exercise parallel range requests
+    yield cache.HTTPCache('http://localhost:%s' % server.server_address[1],
+                          n_jobs=4, chunksize=1000)
+    server.shutdown()
+    server.server_close()
+    shutil.rmtree(root)
+
+
+def fetch(s):
+    """
+    Remove the step's output directory and execute it again
+    Returns: whether it was run
+    """
+    shutil.rmtree(s._output_dirname)
+    n = len(runs)
+    s = Numbers(n=s.n)
+    s.execute(output=s)
+    assert s.result.equals(pd.DataFrame({'a': range(s.n)}))
+    assert os.path.exists(s._target_filename)
+    return len(runs) > n
+
+
+def test_filesystem_cache(drain_setup):
+    root = tempfile.mkdtemp()
+    cache.configure(root)
+    try:
+        s = Numbers(n=10)
+        s.execute(output=s)
+        assert not fetch(s)
+    finally:
+        cache.configure(None)
+        shutil.rmtree(root)
+
+
+def test_http_cache(drain_setup, http_cache):
+    cache.CACHE = http_cache
+    try:
+        s = Numbers(n=1000)
+        s.execute(output=s)
+        assert http_cache._get_manifest(s._digest)['size'] > 4*1000
+        assert not fetch(s)
+    finally:
+        cache.configure(None)
+
+
+def test_cache_hash_mismatch(drain_setup):
+    root = tempfile.mkdtemp()
+    c = cache.configure(root)
+    try:
+        s = Numbers(n=20)
+        s.execute(output=s)
+        with open(c._filename(s._digest, '.tar'), 'r+b') as f:
+            f.seek(1000)
+            f.write(b'corrupt')
+        # the corrupt entry is ignored and the step is run
+        assert fetch(s)
+    finally:
+        cache.configure(None)
+        shutil.rmtree(root)
+
+
+def test_cache_pickled_result(drain_setup):
+    root = tempfile.mkdtemp()
+    cache.configure(root)
+    try:
+        s = Count(n=30)
+        s.execute(output=s)
+        shutil.rmtree(s._output_dirname)
+        n = len(runs)
+        s = Count(n=30)
+        s.execute(output=s)
+        assert s.result == 30
+        assert len(runs) == n
+        assert os.path.exists(os.path.join(s._dump_dirname, 'result.pkl'))
+    finally:
+        cache.configure(None)
+        shutil.rmtree(root)
+
+
+def test_cache_load_failed(drain_setup):
+    root = tempfile.mkdtemp()
+    cache.configure(root)
+    try:
+        s = Count(n=31)
+        s.execute(output=s)
+        shutil.rmtree(s._output_dirname)
+        n = len(runs)
+        s = Count(n=31)
+        s.load = lambda: 1/0
+        # the fetched dump cannot be loaded so the step is run
+        s.execute(output=s)
+        assert s.result == 31
+        assert len(runs) == n + 1
+    finally:
+        cache.configure(None)
+        shutil.rmtree(root)
@@ -0,0 +1,49 @@
+import json
+import os
+
+from drain import catalog
+from drain.step import Step
+
+
+class Constant(Step):
+    def __init__(self, value, options):
+        Step.__init__(self, value=value, options=options)
+
+    def run(self):
+        return self.value
+
+
+def test_record(drain_setup):
+    s = Constant(value=1, options={'a': 2})
+    s.execute(output=s)
+
+    rows = catalog.query('digest = ?', (s._digest,))
+    assert len(rows) == 1
+    assert rows[0]['class'] == 'Constant'
+    assert rows[0]['target'] == s._target_filename
+    assert rows[0]['dump_size'] > 0
+    assert json.loads(rows[0]['kwargs']) == {'value': 1, 'options.a': 2}
+
+    assert s._output_dirname in catalog.dirnames("class = 'Constant'")
+    catalog.forget([s._output_dirname])
+    assert s._output_dirname not in catalog.dirnames()
+
+
+def test_rebuild(drain_setup):
+    s = Constant(value=2, options={})
+    s.execute(output=s)
+    catalog.forget([s._output_dirname])
+
+    catalog.rebuild()
+    assert s._output_dirname in catalog.dirnames()
+
+
+def test_record_failed(drain_setup, monkeypatch):
+    def fail(path=None):
+        raise OSError('read-only file system')
+    monkeypatch.setattr(catalog, 'connect', fail)
+
+    # the step is dumped though it could not be recorded
+    s = Constant(value=3, options={})
+    s.execute(output=s)
+    assert os.path.exists(s._target_filename)
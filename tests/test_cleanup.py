@@ -0,0 +1,52 @@
+import os
+
+from drain import cleanup, step
+from drain.step import Step
+
+
+class Constant(Step):
+    def __init__(self, value):
+        Step.__init__(self, value=value)
+
+    def run(self):
+        return self.value
+
+
+def test_parse_size():
+    assert cleanup.parse_size('2K') == 2048
+    assert cleanup.parse_size('1.5G') == 1.5*2**30
+    assert cleanup.parse_size(100) == 100
+
+
+def test_select():
+    stats = {'a': (10, 1), 'b': (20, 3), 'c': (30, 2)}
+    assert cleanup.select(stats, reachable={'b'}) == ['a', 'c']
+    assert cleanup.select(stats, reachable={'b'}, budget=50) == ['a']
+
+
+def test_collect(drain_setup):
+    kept, evicted = Constant(value='kept'), Constant(value='evicted')
+    for s in (kept, evicted):
+        s.target = True
+        s.execute(output=s)
+
+    assert evicted._output_dirname in \
+        [d for d, size in cleanup.collect([kept], dry_run=True)]
+    assert os.path.exists(evicted._output_dirname)
+
+    cleanup.collect([kept], keep_yaml=True)
+    assert os.path.exists(evicted._yaml_filename)
+    assert not os.path.exists(evicted._dump_dirname)
+    assert os.path.exists(kept._dump_dirname)
+    assert kept._output_dirname in step._output_dirnames()
+
+
+def test_collect_non_target_leaf(drain_setup):
+    t = Constant(value='target input')
+    t.target = True
+    t.execute(output=t)
+
+    leaf = Constant(value=2)
+    leaf.inputs = [t]
+    assert t._output_dirname not in \
+        [d for d, size in cleanup.collect([leaf], dry_run=True)]
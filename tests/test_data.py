@@ -17,6 +17,18 @@ def test_to_hdf():
     for key in r1.keys():
        assert r0[key].equals(r1[key])
 
+def test_to_hdf_modifies_inputs():
+    # waits for its inputs' background dumps before encoding them in place
+    assert data.ToHDF(objects_to_ascii=True).modifies_inputs
+    assert not data.ToHDF().modifies_inputs
+
+def test_to_hdf_load_args(drain_setup):
+    h = data.ToHDF(objects_to_ascii=False, put_args={})
+    h.setup_dump()
+    pd.HDFStore(os.path.join(h._dump_dirname, 'result.h5'), mode='w').close()
+    h.load(columns=['a'], where='a > 0')
+    h.result.close()
+
 def test_date_select():
     df = pd.DataFrame({'date':pd.to_datetime(
             [date(2013,m,1) for m in range(1,13)])})
@@ -0,0 +1,89 @@
+import time
+
+import pandas as pd
+import pytest
+
+from drain import distributed, schedule
+from drain.step import Step
+
+
+class Frame(Step):
+    def __init__(self, n, inputs=None):
+        Step.__init__(self, n=n, inputs=inputs)
+        self.target = True
+
+    def run(self, *dfs):
+        return pd.DataFrame({'a': range(self.n + sum(len(df) for df in dfs))})
+
+
+def test_local_cluster(drain_setup):
+    a = Frame(n=2)
+    b = Frame(n=3, inputs=[a])
+    c = Frame(n=4)
+
+    with distributed.local_cluster(2) as coordinator:
+        launcher = distributed.DistributedLauncher(coordinator)
+        failed = schedule.Scheduler(cores=coordinator.slots, launcher=launcher,
+                                    poll_interval=0.01).run([b, c])
+
+    assert failed == set()
+    b.load()
+    assert len(b.result) == 5
+    # b runs on the worker which produced a
+    assert launcher.locations[b._output_dirname] == launcher.locations[a._output_dirname]
+
+
+def test_local_cluster_fused(drain_setup):
+    a = Frame(n=6)
+    b = Frame(n=7, inputs=[a])
+
+    with distributed.local_cluster(1) as coordinator:
+        launcher = distributed.DistributedLauncher(coordinator)
+        failed = schedule.Scheduler(cores=coordinator.slots, launcher=launcher,
+                                    poll_interval=0.01, fuse=True).run([b])
+
+    assert failed == set()
+    for s, n in ((a, 6), (b, 13)):
+        s.load()
+        assert len(s.result) == n
+        assert s._output_dirname in launcher.locations
+
+
+def test_place():
+    class Coordinator(object):
+        workers = {'w0': 1, 'w1': 2}
+
+    a, b = Frame(n=0), Frame(n=1)
+    launcher = distributed.DistributedLauncher(Coordinator())
+    launcher.locations = {a._output_dirname: 'w0'}
+    assert launcher.place(Frame(n=2, inputs=[a]), [a]) == 'w0'
+    assert launcher.place(b, []) == 'w1'
+
+    launcher._assigned = {'w0': 1}
+    assert launcher.place(Frame(n=2, inputs=[a]), [a]) == 'w1'
+
+
+def test_authkey():
+    with pytest.raises(ValueError):
+        distributed.Coordinator()
+    assert distributed.parse_address(':1234') == ('localhost', 1234)
+
+
+def test_lost_worker(drain_setup):
+    coordinator = distributed.Coordinator(authkey=b'test')
+    coordinator._add_worker('w0', 1)
+    launcher = distributed.DistributedLauncher(coordinator, heartbeat_timeout=0.1)
+    task = launcher(Frame(n=9), [])
+    assert task.poll() is None
+
+    # the worker never sends a heartbeat
+    time.sleep(0.2)
+    assert task.poll() == -1
+    assert coordinator.workers == {}
+
+
+def test_heartbeat(monkeypatch):
+    monkeypatch.setattr(distributed, 'HEARTBEAT_INTERVAL', 0.05)
+    with distributed.local_cluster(1) as coordinator:
+        time.sleep(0.5)
+        assert coordinator.dead_workers(timeout=0.25) == []
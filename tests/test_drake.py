@@ -61,3 +61,29 @@ def test_drakefile(drain_setup):
     steps = [Step(a=1, inputs=inputs),
              Step(a=2, inputs=inputs)]
     print(to_drakefile(steps, preview=True))
+
+def test_status(drain_setup):
+    a = Step(status=1)
+    a.target = True
+    b = Step(status=2, inputs=[a])
+    b.target = True
+    c = Step(status=3, inputs=[b])
+    data = get_drake_data([c])
+
+    reasons = status(data)
+    assert reasons[a] == ['missing target']
+    assert reasons[b] == ['missing target', 'stale input %s' % a._output_dirname]
+    assert reasons[c] == ['not a target', 'stale input %s' % b._output_dirname]
+
+    for s in (a, b):
+        s.setup_dump()
+        open(s._target_filename, 'w').close()
+    reasons = status(data)
+    assert reasons[a] == reasons[b] == []
+    assert reasons[c] == ['not a target']
+
+    t = os.path.getmtime(b._target_filename) + 10
+    os.utime(a._target_filename, (t, t))
+    b.dependencies = ['/nonexistent']
+    assert status(data)[b] == ['newer input %s' % a._output_dirname,
+                               'missing dependency /nonexistent']
@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from drain.exploration import StepFrame
+from drain.step import Step
+
+
+def value(step, offset=0):
+    return step.value + offset
+
+
+def difference(step, other):
+    return step.value - other.value
+
+
+def steps():
+    return StepFrame(index=[Step(value=v) for v in range(3)])
+
+
+def test_dapply_executor():
+    df = steps()
+    serial = df.dapply(value, offset=[0, 10])
+    with ThreadPoolExecutor(2) as executor:
+        parallel = df.dapply(value, offset=[0, 10], executor=executor)
+
+    assert serial.equals(parallel)
+    assert list(parallel.values[:, 1]) == [10, 11, 12]
+
+
+def test_dapply_pairwise():
+    df = steps()
+    with ThreadPoolExecutor(2) as executor:
+        r = df.dapply(difference, pairwise=True, symmetric=False, executor=executor)
+
+    assert r.values[2, 0] == 2
+    assert r.values[0, 2] == -2
+    assert r.isnull().values.diagonal().all()
+
+
+def test_expand_cached():
+    df = steps()
+    df['x'] = 0
+    expanded = df.expand()
+    assert list(expanded.index) == [0, 1, 2]
+    # the cached parameter table is reused but the values are current
+    df['x'] = 1
+    assert list(df.expand()['x']) == [1, 1, 1]
+
+    df.index = [Step(value=v) for v in range(3, 6)]
+    assert list(df.expand().index) == [3, 4, 5]
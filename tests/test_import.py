@@ -0,0 +1,47 @@
+import os
+import subprocess
+import sys
+
+import drain
+
+# imported only by the functions which use them, see drain/__init__.py
+HEAVY = ['sklearn', 'tables', 'sqlalchemy', 'scipy', 'statsmodels']
+
+
+def loaded(code):
+    """
+    Run code in a clean subprocess
+    Returns: the heavy modules it loaded
+    """
+    root = os.path.dirname(os.path.dirname(os.path.abspath(drain.__file__)))
+    code = 'import sys\n' + code + \
+        '\nprint("loaded:" + ",".join(m for m in %r if m in sys.modules))' % HEAVY
+    # a clean environment so that nothing else is imported at startup
+    env = {k: v for k, v in os.environ.items() if k not in ('PYTHONPATH', 'DRAINPATH')}
+    env['PYTHONPATH'] = root
+    output = subprocess.check_output([sys.executable, '-c', code], env=env)
+    return output.decode().strip().split('loaded:')[-1]
+
+
+def test_lazy_imports():
+    """
+    What bin/run_step.py and the drain command import before loading steps
+    """
+    assert loaded('import drain, drain.drake, drain.schedule') == ''
+
+
+def test_lazy_imports_execute():
+    """
+    Executing and dumping a step, which logs its repr, as run_step.py does
+    """
+    code = ('import tempfile\n'
+            'import drain\n'
+            'from drain.step import Step\n'
+            'drain.PATH = tempfile.mkdtemp()\n'
+            'class Constant(Step):\n'
+            '    def run(self):\n'
+            '        return self.value\n'
+            's = Constant(value=1)\n'
+            's.execute(output=s)\n'
+            'print(s)')
+    assert loaded(code) == ''
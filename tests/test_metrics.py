@@ -1,5 +1,6 @@
 import numpy as np
-from drain.metrics import precision
+from drain import metrics
+from drain.metrics import precision, precision_series, RankedScores
 
 from numpy.testing import assert_almost_equal
 import pytest
@@ -16,3 +17,59 @@ def test_precision_nan():
 
     p = precision(y_true, y_score,None, return_bounds=True)
     assert p == (.5, 2, 1.0/3, 2.0/3)
+
+def test_ranked_scores():
+    y_true = np.array([True, False, np.nan, True, False])
+    y_score = np.array([.9, .8, .7, .1, .5])
+    ranked = RankedScores(y_true, y_score)
+
+    for k in range(1, 6):
+        assert_almost_equal(ranked.precision(k, return_bounds=True),
+                            precision(y_true, y_score, k, return_bounds=True))
+    assert ranked.get_k(p=.5) == 2
+
+def test_precision_series_top_k():
+    y_true = np.array([True, False, np.nan, True, False, True])
+    y_score = np.array([.9, .8, .7, .1, .5, .6])
+
+    assert_almost_equal(precision_series(y_true, y_score, k=3).values,
+                        precision_series(y_true, y_score).values[:3])
+    assert precision(y_true, y_score, k=3) == .5
+
+def test_accumulators():
+    y_true = np.array([True, False, np.nan, True, False, True, np.nan, False])
+    y_score = np.array([.9, .8, .7, .1, .5, .6, .2, .4])
+
+    def accumulators():
+        return [metrics.CountAccumulator(), metrics.BaselineAccumulator(),
+                metrics.PrecisionAccumulator(k=3), metrics.RecallAccumulator(k=5)]
+
+    # two partitions of two chunks each, merged
+    chunks = [(y_true[i:i+2], y_score[i:i+2]) for i in range(0, len(y_true), 2)]
+    left, right = accumulators(), accumulators()
+    assert metrics.accumulate(chunks[:2], left)[0] == 3
+    metrics.accumulate(chunks[2:], right)
+    values = [a.merge(b).value() for a, b in zip(left, right)]
+
+    assert values == [metrics.count(y_true), metrics.baseline(y_true),
+                      metrics.precision(y_true, y_score, k=3),
+                      metrics.recall(y_true, y_score, k=5)]
+
+def test_roc_auc_accumulator():
+    y_true = np.array([True, False, np.nan, True, False, True, np.nan, False])
+    y_score = np.array([.9, .8, .7, .1, .5, .6, .2, .4])
+
+    a = metrics.RocAucAccumulator(bins=100)
+    a.update(y_true, y_score)
+    assert_almost_equal(a.value(), metrics.roc_auc(y_true, y_score))
+
+def test_roc_auc_accumulator_range():
+    y_true = np.array([True, False, True, False])
+    y_score = np.array([2.5, -1., 1.5, -3.])
+
+    with pytest.warns(UserWarning):
+        metrics.RocAucAccumulator(bins=100).update(y_true, y_score)
+
+    a = metrics.RocAucAccumulator(bins=100, range=(-3, 3))
+    a.update(y_true, y_score)
+    assert_almost_equal(a.value(), metrics.roc_auc(y_true, y_score))
@@ -1,7 +1,9 @@
 import pandas as pd
 import numpy as np
+import pytest
 
-from drain.model import y_subset
+from drain import model, metrics
+from drain.model import y_subset, FitPredict
 
 y = pd.DataFrame({
     'score':[.1,1,.2,.3,0],
@@ -18,3 +20,79 @@ def test_subset_dropna():
 
 def test_subset_k():
    assert set(y_subset(y, k=2).index) == set([1,3])
+
+def test_ranked_metrics():
+    from drain import metrics, model
+    from drain.step import Step
+    from numpy.testing import assert_almost_equal
+
+    s = Step(value='ranked')
+    s.result = {'y': y}
+    for k in range(0, 6):
+        y_true, y_score = model.true_score(y, k=k)
+        assert_almost_equal(model.precision(s, k=k, return_bounds=True),
+                            metrics.precision(y_true, y_score, return_bounds=True))
+        assert model.count(s, k=k) == metrics.count(y_true)
+        assert model.recall(s, k=k, prop=False) == metrics.recall(y_true, y_score)
+
+def test_ranked_metrics_p():
+    from drain import metrics, model
+    from drain.step import Step
+
+    s = Step(value='ranked_p')
+    s.result = {'y': y}
+    y_true, y_score = model.true_score(y, p=.5, dropna=True)
+    assert model.recall(s, p=.5, dropna=True, prop=False) == \
+        metrics.recall(y_true, y_score)
+
+def test_similarity_matrix():
+    from drain import model
+    from drain.step import Step
+
+    steps = [Step(value=i) for i in range(3)]
+    for i, s in enumerate(steps):
+        s.result = {'y': pd.DataFrame({'score': np.roll(y.score.values, i)}, index=y.index)}
+
+    similarity = model.similarity_matrix(steps, k=2)
+    overlap = model.overlap_matrix(steps, k=2)
+    for s in steps:
+        for t in steps:
+            top_s = model.y_subset(s.result['y'], k=2).index
+            top_t = model.y_subset(t.result['y'], k=2).index
+            intersection = len(top_s.intersection(top_t))
+            assert overlap.loc[s, t] == intersection
+            assert similarity.loc[s, t] == np.float32(intersection) / len(top_s.union(top_t))
+
+
+def test_fit_predict_load_columns(drain_setup):
+    f = FitPredict(inputs=[], return_feature_importances=False, predict_train=True)
+    f.result = {'y': y}
+    f.setup_dump()
+    f.dump()
+
+    f = FitPredict(inputs=[], return_feature_importances=False, predict_train=True)
+    f.load(columns=['score'])
+    assert list(f.result['y'].columns) == ['score']
+
+
+def test_metric_functions():
+    names = [name for name, function in model.metric_functions]
+    assert 'precision' in names
+    assert not hasattr(model, 'accumulate')
+
+
+def test_y_chunks(drain_setup):
+    y = pd.DataFrame({'true': [1., 0, np.nan, 1, 0], 'score': [.9, .1, .5, .4, .3]})
+    f = FitPredict(inputs=[], return_feature_importances=False, prefit=True)
+    f.result = {'y': y}
+    f.setup_dump()
+    f.dump()
+    with pytest.raises(ValueError):
+        next(model.y_chunks(f))
+
+    f.storage = {'format': 'table'}
+    f.dump()
+    chunks = list(model.y_chunks(f, chunksize=2))
+    assert len(chunks) == 3
+    assert metrics.accumulate(chunks, metrics.CountAccumulator()) == \
+        metrics.count(y.true.values)
@@ -0,0 +1,63 @@
+import os
+
+import pandas as pd
+
+from drain import profiling, step
+from drain.step import Step
+
+
+class Range(Step):
+    def __init__(self, n, inputs=None):
+        Step.__init__(self, n=n, inputs=inputs)
+
+    def run(self, *dfs):
+        return pd.DataFrame({'a': range(self.n)})
+
+
+def test_profile(drain_setup):
+    a = Range(n=100)
+    a.target = True
+    a.execute(output=a)
+
+    profile = profiling.read(a)
+    assert profile['digest'] == a._digest
+    assert set(profile['phases']) == {'run', 'dump'}
+    assert profile['phases']['run']['wall'] >= 0
+    assert profile['result_bytes'] > 0
+    assert profile['dump_bytes'] > 0
+
+    a = Range(n=100)
+    a.target = True
+    b = Range(n=10, inputs=[a])
+    b.target = True
+    b.execute(inputs=[a], output=b)
+    assert set(profiling.read(b)['phases']) == {'load', 'run', 'dump'}
+
+    df = profiling.report([b])
+    assert set(df.index) == {a._output_dirname, b._output_dirname}
+    assert (df.wall >= 0).all()
+
+
+def test_profile_failed(drain_setup, monkeypatch):
+    def fail(result):
+        raise ValueError()
+    monkeypatch.setattr(step, 'result_nbytes', fail)
+
+    # the dumped step is complete though it could not be profiled
+    a = Range(n=20)
+    a.execute(output=a)
+    assert os.path.exists(a._target_filename)
+    assert profiling.read(a) is None
+
+
+def test_critical_path():
+    a, b, c, d = [Range(n=n) for n in range(4)]
+    b.inputs = [a]
+    c.inputs = [a]
+    d.inputs = [b, c]
+    for s in (a, b, c, d):
+        s.target = True
+
+    path, total = profiling.critical_path([d], durations={a: 1, b: 2, c: 5, d: 1})
+    assert path == [a, c, d]
+    assert total == 7
@@ -0,0 +1,124 @@
+import os
+import time
+
+from drain import schedule, drake
+from drain.step import Step
+
+
+class Task(Step):
+    def __init__(self, label, inputs=None):
+        Step.__init__(self, label=label, inputs=inputs)
+        self.target = True
+
+    def run(self, *args):
+        return self.label
+
+
+class Launcher(object):
+    """
+    Executes steps in process after they have been polled a few times
+    """
+    def __init__(self):
+        self.launched = []
+        self.running = []
+        self.max_running = 0
+
+    def __call__(self, step, inputs, outputs=None):
+        self.launched.append(step.label)
+        self.running.append(step)
+        self.max_running = max(self.max_running, len(self.running))
+        return Process(self, step, inputs, outputs)
+
+
+class Process(object):
+    def __init__(self, launcher, step, inputs, outputs=None):
+        self.launcher = launcher
+        self.step = step
+        self.inputs = inputs
+        self.outputs = outputs if outputs is not None else step
+        self.polls = 3
+
+    def poll(self):
+        self.polls -= 1
+        if self.polls > 0:
+            return None
+        self.step.execute(output=self.outputs, inputs=list(self.inputs))
+        self.launcher.running.remove(self.step)
+        return 0
+
+
+def test_critical_path_first(drain_setup):
+    a = Task('a')
+    b = Task('b', inputs=[a])
+    c = Task('c')
+    for s, duration in ((a, 10), (b, 10), (c, 1)):
+        s.resources = {'duration': duration}
+
+    launcher = Launcher()
+    scheduler = schedule.Scheduler(cores=1, launcher=launcher, poll_interval=0)
+    assert scheduler.run([b, c]) == set()
+    assert launcher.launched == ['a', 'b', 'c']
+
+    # nothing is stale
+    launcher = Launcher()
+    scheduler.launcher = launcher
+    scheduler.run([b, c])
+    assert launcher.launched == []
+
+
+def test_packing(drain_setup):
+    steps = [Task('pack%s' % i) for i in range(4)]
+    for s in steps:
+        s.resources = {'cores': 2, 'memory': 2**30}
+
+    launcher = Launcher()
+    schedule.Scheduler(cores=4, launcher=launcher, poll_interval=0).run(steps, force=True)
+    assert launcher.max_running == 2
+
+    launcher = Launcher()
+    schedule.Scheduler(cores=4, memory=2**30, launcher=launcher,
+                       poll_interval=0).run(steps, force=True)
+    assert launcher.max_running == 1
+
+
+def test_stale(drain_setup):
+    a = Task('stale_a')
+    b = Task('stale_b', inputs=[a])
+    data = drake.get_drake_data([b])
+    assert schedule.stale(data) == {a, b}
+
+    a.execute(output=a)
+    b.execute(output=b)
+    assert schedule.stale(data) == set()
+
+    t = time.time() + 10
+    os.utime(a._target_filename, (t, t))
+    assert schedule.stale(data) == {b}
+
+
+def test_fuse():
+    a = Task('fuse_a')
+    b = Task('fuse_b', inputs=[a])
+    c = Task('fuse_c', inputs=[b])
+    d = Task('fuse_d', inputs=[b])
+    data = drake.get_drake_data([c, d])
+    # b has two consumers so it ends its group
+    assert schedule.fuse(data, set(data)) == {b: {a, b}, c: {c}, d: {d}}
+    # a's consumer is up to date
+    assert schedule.fuse(data, {a, c}) == {a: {a}, c: {c}}
+
+    assert schedule.run_step_args(b, [], outputs={a, b}) == \
+        sorted([a._target_filename, b._target_filename]) + [b._yaml_filename]
+
+
+def test_run_fused(drain_setup):
+    a = Task('run_fused_a')
+    b = Task('run_fused_b', inputs=[a])
+    c = Task('run_fused_c', inputs=[b])
+    d = Task('run_fused_d')
+
+    launcher = Launcher()
+    scheduler = schedule.Scheduler(cores=2, launcher=launcher, poll_interval=0, fuse=True)
+    assert scheduler.run([c, d]) == set()
+    assert sorted(launcher.launched) == ['run_fused_c', 'run_fused_d']
+    assert schedule.stale(drake.get_drake_data([c, d])) == set()
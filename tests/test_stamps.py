@@ -0,0 +1,93 @@
+import importlib
+import os
+import sys
+import tempfile
+import time
+
+import drain
+from drain import drake, stamps
+
+SOURCE = '''
+from drain.step import Step
+
+
+class First(Step):
+    pass
+
+
+class Second(Step):
+    pass
+'''
+
+
+def _set_mtime(filename, t):
+    os.utime(filename, (t, t))
+
+
+def test_content_hash(drain_setup):
+    dirname = tempfile.mkdtemp()
+    module = os.path.join(dirname, 'stamped_steps.py')
+    with open(module, 'w') as f:
+        f.write(SOURCE)
+    dependency = os.path.join(dirname, 'query.sql')
+    with open(dependency, 'w') as f:
+        f.write('select 1')
+    past = time.time() - 100
+    for filename in (module, dependency):
+        _set_mtime(filename, past)
+
+    sys.path.insert(0, dirname)
+    try:
+        stamps.ENABLED = True
+        stamped_steps = importlib.import_module('stamped_steps')
+        s = stamped_steps.First(dependencies=[dependency])
+        s.target = True
+        s.setup_dump()
+        _set_mtime(s._yaml_filename, past)
+        open(s._target_filename, 'w').close()
+        _set_mtime(s._target_filename, past + 50)
+        data = drake.get_drake_data([s])
+        assert drake.status(data)[s] == []
+        # status is a dry run
+        assert not os.path.exists(os.path.join(drain.PATH, stamps.DIRNAME))
+
+        # written by the Drakefile, see to_drake_step()
+        dependencies, sources = drake.get_dependencies(s)
+        stamps.save()
+        stamp = dependencies[0]
+        with open(stamp) as f:
+            digest = f.read()
+        assert drake.status(data)[s] == []
+
+        # touched but unchanged
+        for filename in (module, dependency):
+            _set_mtime(filename, time.time() + 10)
+        assert drake.status(data)[s] == []
+
+        # another class in the same file changed
+        with open(module, 'a') as f:
+            f.write('    x = 1\n')
+        assert drake.status(data)[s] == []
+
+        with open(dependency, 'w') as f:
+            f.write('select 2')
+        _set_mtime(dependency, time.time() + 20)
+        reasons = drake.status(data)[s]
+        assert len(reasons) == 1 and reasons[0].startswith('changed dependency')
+        with open(stamp) as f:
+            assert f.read() == digest
+        # still changed
+        assert drake.status(data)[s] == reasons
+
+        with open(module, 'w') as f:
+            f.write(SOURCE.replace('class First(Step):\n', 'class First(Step):\n    y = 2\n'))
+        reasons = drake.status(data)[s]
+        assert reasons[-1] == 'changed source %s' % \
+            os.path.join(drain.PATH, stamps.DIRNAME, 'stamped_steps.First')
+
+        stamps.ENABLED = False
+        reasons = drake.status(data)[s]
+        assert 'changed source %s' % module in reasons
+    finally:
+        stamps.ENABLED = False
+        sys.path.remove(dirname)
@@ -1,7 +1,11 @@
 from drain.step import *
-from drain import step
+from drain import step, profiling
 import numpy as np
 import tempfile
+import pytest
+import os
+
+import drain
 
 class Scalar(Step):
     def __init__(self, value):
@@ -26,6 +30,52 @@ def test_run(drain_setup):
     s.execute()
     assert s.result == 45
 
+class Offset(Scalar):
+    def __init__(self, value, offset):
+        Step.__init__(self, value=value, offset=offset)
+
+
+def test_positional_arguments():
+    assert Scalar(1)._kwargs == {'value': 1}
+    # not the argument names of the parent class
+    assert Offset(1, 2)._kwargs == {'value': 1, 'offset': 2}
+    assert Scalar(3)._kwargs == {'value': 3}
+
+class Negative(Scalar):
+    def __init__(self, value):
+        Step.__init__(self, value=-value)
+
+def test_arguments_stored_once():
+    s = Scalar(value=[1])
+    assert 'value' not in s.__dict__
+    assert s.value is s._kwargs['value']
+    # an argument changed by __init__ is stored as an attribute
+    n = Negative(1)
+    assert n.value == -1 and n._kwargs == {'value': 1}
+    assert not hasattr(s, 'missing')
+    # inputs passed as None default to an empty list
+    assert Add(inputs=None).inputs == []
+
+class Default(Step):
+    x = 1
+
+def test_arguments_shadowing_attributes():
+    assert Step(target=True).target
+    assert Step(name='foo').name == 'foo'
+    assert Step(resources={'cores': 2}).resources == {'cores': 2}
+    assert Default(x=5).x == 5
+    assert Default().x == 1
+
+def test_paths_follow_digest(drain_setup):
+    s = Scalar(value='paths')
+    assert s._output_dirname == os.path.join(drain.PATH, 'Scalar', s._digest[:8])
+    assert s._target_filename == os.path.join(s._output_dirname, 'target')
+    assert '_output_dirname' not in s.__dict__
+    s.__dict__['_dump_dirname'] = 'redirected'
+    assert s._dump_dirname == 'redirected'
+    del s.__dict__['_dump_dirname']
+    assert s._dump_dirname == os.path.join(s._output_dirname, 'dump')
+
 def test_run_map_results():
     s = Divide(inputs=[MapResults(
             inputs=[Scalar(value=1), Scalar(value=2)], 
@@ -135,6 +185,226 @@ def test_dump_hdf_dict():
     for k in r:
         assert r[k].equals(t.result[k])
 
+def test_dump_hdf_storage(drain_setup):
+    t = DumpStep(n=0, n_df=5, return_list=True)
+    t.storage = dict(codec='zlib', level=9, format='table')
+
+    t.execute()
+    r = t.result
+    t.dump()
+    t.load()
+
+    for a,b in zip(r,t.result):
+        assert a.equals(b)
+
+    store = pd.HDFStore(os.path.join(t._dump_dirname, 'result.h5'), mode='r')
+    assert store.get_storer('0').is_table
+    assert store.get_storer('0').table.filters.complevel == 9
+    store.close()
+
+def test_dump_hdf_split(drain_setup):
+    for return_list in (True, False):
+        t = DumpStep(n=0, n_df=5, return_list=return_list)
+        t.storage = dict(layout='split', n_jobs=2)
+
+        t.execute()
+        r = t.result
+        t.dump()
+        assert os.path.isfile(os.path.join(t._dump_dirname, 'manifest.yaml'))
+        assert os.path.isfile(os.path.join(t._dump_dirname, '4.h5'))
+        t.load()
+
+        if return_list:
+            for a,b in zip(r,t.result):
+                assert a.equals(b)
+        else:
+            assert set(r) == set(t.result)
+            for k in r:
+                assert r[k].equals(t.result[k])
+
+class Frame(Step):
+    def run(self):
+        return pd.DataFrame({'a': range(5), 'b': range(5, 10),
+                             'date': pd.date_range('2015-01-01', periods=5)})
+
+
+class Project(Step):
+    def get_load_args(self, input):
+        return {'columns': ['date', 'a'], 'where': "date >= '2015-01-04'"}
+
+    def run(self, df):
+        return df
+
+
+class Collect(Step):
+    def run(self, *args):
+        return args
+
+def test_load_columns_where(drain_setup):
+    for storage in ({}, {'format': 'table', 'data_columns': ['date']}, {'format': 'table'}):
+        f = Frame()
+        f.storage = storage
+        f.execute(output=f)
+
+        f = Frame()
+        p = Project(inputs=[f])
+        p.execute(inputs=[f])
+        assert list(p.result.columns) == ['date', 'a']
+        assert list(p.result.a) == [3, 4]
+
+def test_load_args_shared(drain_setup):
+    f = Frame()
+    f.execute(output=f)
+
+    f = Frame()
+    p = Project(inputs=[f])
+    s = Collect(inputs=[p, f])
+    s.execute(inputs=[f])
+    # loaded in full for the second consumer
+    assert len(f.result) == 5
+    assert list(f.result.columns) == ['a', 'b', 'date']
+
+class Fail(Step):
+    def run(self):
+        raise RuntimeError('failed')
+
+
+def test_dump_atomic(drain_setup):
+    f = Frame()
+    f.execute(output=f)
+    assert os.path.exists(f._target_filename)
+    assert sorted(os.listdir(f._output_dirname)) == ['dump', 'profile.yaml', 'step.yaml', 'target']
+
+    f.execute(output=f, keep_previous=True)
+    assert sorted(os.listdir(f._output_dirname)) == ['dump', 'profile.yaml', 'step.yaml', 'target']
+
+def test_dump_permissions(drain_setup):
+    f = Frame(n=11)
+    f.execute(output=f)
+    umask = os.umask(0)
+    os.umask(umask)
+    assert os.stat(f._dump_dirname).st_mode & 0o777 == 0o777 & ~umask
+
+    # a temporary directory left by a killed run is removed by the next run
+    os.mkdir(os.path.join(f._output_dirname, step.TEMP_PREFIX + 'killed'))
+    f.execute(output=f)
+    assert [d for d in os.listdir(f._output_dirname) if d.startswith('.')] == []
+
+def test_dump_keep_previous(drain_setup):
+    f = Fail()
+    os.makedirs(f._dump_dirname)
+    util.touch(os.path.join(f._dump_dirname, 'result.pkl'))
+    util.touch(f._target_filename)
+
+    for keep_previous in (True, False):
+        try:
+            f.execute(output=f, keep_previous=keep_previous)
+        except RuntimeError:
+            pass
+        assert os.path.exists(f._target_filename) == keep_previous
+        assert os.path.exists(os.path.join(f._dump_dirname, 'result.pkl')) == keep_previous
+        # the temporary dump directory is removed
+        assert [d for d in os.listdir(f._output_dirname) if d.startswith('.')] == []
+
+class Increment(Step):
+    # adds one to its input in place
+    modifies_inputs = True
+
+    def run(self, df):
+        df['a'] += 1
+        return df
+
+
+class FailDump(Step):
+    def run(self, *args):
+        return 0
+
+    def dump(self):
+        raise IOError('failed')
+
+
+def test_execute_outputs(drain_setup):
+    f = Frame()
+    i = Increment(inputs=[f])
+    i.execute(output=[f, i])
+    assert list(i.result.a) == [1, 2, 3, 4, 5]
+    for s in (f, i):
+        assert os.path.exists(s._target_filename)
+        assert profiling.read(s) is not None
+
+    # the input was dumped before it was modified
+    f = Frame()
+    f.load()
+    assert list(f.result.a) == [0, 1, 2, 3, 4]
+
+def test_execute_outputs_dump_failed(drain_setup):
+    f = Frame()
+    d = FailDump(inputs=[f])
+    try:
+        d.execute(output=[f, d])
+        assert False
+    except IOError:
+        pass
+    assert os.path.exists(f._target_filename)
+    assert not os.path.exists(d._target_filename)
+    assert [n for n in os.listdir(d._output_dirname) if n.startswith('.')] == []
+
+class RecordPending(Frame):
+    def dump(self):
+        self.pending = self.dumper._pending
+        Frame.dump(self)
+
+
+def test_dumper_maxbytes(drain_setup):
+    dumper = Dumper(maxbytes=1)
+    steps = [RecordPending(n=n) for n in range(3)]
+    for s in steps:
+        s.dumper = dumper
+        s.result = s.run()
+        s._begin_dump()
+        dumper.submit(s)
+    dumper.close()
+    dumper.check()
+
+    for s in steps:
+        # dumped one at a time
+        assert s.pending == step.result_nbytes(s.result)
+        assert os.path.exists(s._target_filename)
+    assert dumper._pending == 0
+
+class FailDumpRepr(Frame):
+    def dump(self):
+        raise ValueError('dump failed')
+
+    def __repr__(self):
+        raise ValueError('repr failed')
+
+def test_dumper_failed(drain_setup):
+    dumper = Dumper(maxbytes=1)
+    steps = [FailDumpRepr(n=n) for n in range(3)]
+    for s in steps:
+        s.result = s.run()
+        s._begin_dump()
+        dumper.submit(s)
+    with pytest.raises(ValueError):
+        dumper.wait(steps)
+    dumper.close()
+
+    # a stopped dumper raises instead of waiting
+    dumper = Dumper()
+    dumper.close()
+    f = Frame(n=8)
+    f.result = f.run()
+    with pytest.raises(RuntimeError):
+        dumper.submit(f)
+
+def test_hdf_args():
+    assert step.hdf_args({}) == ({}, {'format': 'fixed'})
+    assert step.hdf_args({'codec': 'zstd', 'chunksize': 10}) == \
+        ({'complib': 'blosc:zstd', 'complevel': 5}, {'format': 'fixed'})
+    assert step.hdf_args({'codec': 'zlib', 'level': 1, 'format': 'table', 'chunksize': 10}) == \
+        ({'complib': 'zlib', 'complevel': 1}, {'format': 'table', 'chunksize': 10})
+
 def test_expand_inputs():
     s = Step(a=1, b={'c':Step(c=2)})
     assert step._expand_inputs(s) == {s, Step(c=2)}
@@ -160,3 +430,27 @@ def test_get_reslt():
     d.execute()
 
     assert d.result == 1
+
+def test_load_parallel(drain_setup):
+    for value in range(3):
+        s = Scalar(value=value)
+        s.execute()
+        s.dump()
+
+    steps = [Scalar(value=value) for value in range(4)]
+    loaded = step.load(steps, reload=True, n_jobs=2)
+    # the step which was never dumped is excluded
+    assert [s.result for s in loaded] == [0, 1, 2]
+    assert step.load(Scalar(value=1)) is loaded[1]
+
+class Series(Step):
+    def run(self):
+        return pd.Series(range(self.n))
+
+def test_load_series(drain_setup):
+    s = Series(n=10)
+    s.execute(output=s)
+    assert step.result_nbytes(s.result) >= 80
+
+    loaded = step.load([Series(n=10)], reload=True)
+    assert loaded[0].result.equals(s.result)
@@ -48,4 +48,27 @@ def test_is_instance_collection_multiple():
 def test_is_instance_collection_false():
     assert not is_instance_collection([pd.DataFrame(), 1], pd.DataFrame)
 
-
+def test_dict_diff_unhashable():
+    assert dict_diff([{0: [1], 2: [3]}, {0: [1], 2: [4]}]) == [{2: [3]}, {2: [4]}]
+
+def test_nunique_unhashable():
+    assert nunique([[1, 2], [1, 2], {'a': 1}]) == 2
+
+def test_lru_cache():
+    cache = LRUCache(maxsize=2, maxbytes=10, sizeof=len)
+    cache.put('a', 'aaa')
+    cache.put('b', 'bbb')
+    cache.get('a')
+    cache.put('c', 'ccc')
+    assert 'b' not in cache and 'a' in cache
+    cache.put('d', 'dddddddd')
+    assert len(cache) == 1 and cache.get('d') == 'dddddddd'
+
+def test_get_argspec():
+    class Estimator(object):
+        def fit(self, X, y, sample_weight=None):
+            pass
+
+    assert get_argspec(Estimator().fit).args == ['self', 'X', 'y', 'sample_weight']
+    # cached by the underlying function
+    assert get_argspec(Estimator().fit) is get_argspec(Estimator.fit)